@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+import contextlib
+import functools
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import simpleais
+from simpleais import tools, BitFieldDecoder, MESSAGE_DECODERS, StreamParser, nmea_checksum, parse_one
+
+
+# Times the library and the command-line tools against a synthetic corpus of AIS
+# messages, and measures the memory needed to hold the whole corpus as sentences,
+# printing a table and optionally writing the results as JSON. Given a previous
+# results file, it reports anything slower or bigger by more than the threshold
+# and exits with status 1, so it can gate upgrades.
+#
+#   devtools/benchmark.py --count 20000 --output results.json
+#   devtools/benchmark.py --count 20000 --compare results.json
+
+# roughly what a busy coastal receiver hears
+DEFAULT_MIX = '1:40,3:15,18:20,5:8,24:6,4:5,21:2,19:1,27:2,8:1'
+
+PAYLOAD_CHARS_PER_FRAGMENT = 60
+EXTRA_VARIABLE_BITS = 120  # for messages that end in free-form text or data
+
+
+def parse_mix(text):
+    result = {}
+    for part in text.split(','):
+        type_id, weight = part.split(':')
+        result[int(type_id)] = float(weight)
+    return result
+
+
+def _bit_length(type_id):
+    fields = [f for f in MESSAGE_DECODERS[type_id].field_decoders if isinstance(f, BitFieldDecoder)]
+    length = max(f.end for f in fields) + 1
+    if any(f.start == f.end and f.data_type in ('t', 'd') for f in fields):
+        length += EXTRA_VARIABLE_BITS
+    return length
+
+
+def _set_bits(value, length, field, field_value):
+    shift = length - field.end - 1
+    mask = (1 << field.length) - 1
+    return value & ~(mask << shift) | (field_value & mask) << shift
+
+
+def _text_bits(rng, characters):
+    value = 0
+    for _ in range(characters):
+        value = value << 6 | rng.randint(1, 26)  # A-Z in AIS six-bit ASCII
+    return value
+
+
+def _armor(value, length):
+    fill = -length % 6
+    value <<= fill
+    chars = []
+    for shift in range(length + fill - 6, -1, -6):
+        n = value >> shift & 0x3F
+        chars.append(chr(n + 48 if n < 40 else n + 56))
+    return ''.join(chars), fill
+
+
+def synthetic_payload(rng, type_id, mmsi):
+    """
+    Returns an armored payload and fill bits for a message of the given type.
+    Fields are random, apart from the type, MMSI, plausible positions, and
+    letters in text fields.
+    """
+    length = _bit_length(type_id)
+    value = rng.getrandbits(length)
+    for field in MESSAGE_DECODERS[type_id].field_decoders:
+        if not isinstance(field, BitFieldDecoder) or field.end >= length:
+            continue
+        if field.name == 'type':
+            value = _set_bits(value, length, field, type_id)
+        elif field.name == 'repeat':
+            value = _set_bits(value, length, field, 0)
+        elif field.name == 'mmsi':
+            value = _set_bits(value, length, field, mmsi)
+        elif field.name in ('lon', 'lat') and field.data_type in ('I4', 'I1'):
+            degrees = rng.uniform(-123.0, -122.0) if field.name == 'lon' else rng.uniform(37.0, 38.0)
+            value = _set_bits(value, length, field, int(degrees * 60 * (10000 if field.data_type == 'I4' else 10)))
+        elif field.data_type == 't' and field.end > field.start:
+            value = _set_bits(value, length, field, _text_bits(rng, field.length // 6))
+    return _armor(value, length)
+
+
+def synthetic_lines(count, mix, seed=0, vessels=200, start_time=1452468000.0, interval=0.05):
+    """
+    Generates lines of timestamped AIS text for count messages, with message
+    types chosen by the weights in mix. Long messages are split into fragments.
+    """
+    rng = random.Random(seed)
+    type_ids = sorted(mix)
+    weights = [mix[t] for t in type_ids]
+    mmsis = [366000000 + rng.randrange(1000000) for _ in range(vessels)]
+    message_id = 0
+    lines = []
+    for i in range(count):
+        type_id = rng.choices(type_ids, weights)[0]
+        payload, fill = synthetic_payload(rng, type_id, rng.choice(mmsis))
+        channel = rng.choice('AB')
+        chunks = [payload[j:j + PAYLOAD_CHARS_PER_FRAGMENT]
+                  for j in range(0, len(payload), PAYLOAD_CHARS_PER_FRAGMENT)]
+        if len(chunks) > 1:
+            message_id = (message_id + 1) % 10
+        for n, chunk in enumerate(chunks, 1):
+            body = '!AIVDM,{},{},{},{},{},{}'.format(len(chunks), n, message_id if len(chunks) > 1 else '', channel,
+                                                    chunk, fill if n == len(chunks) else 0)
+            text = '{}*{:02X}'.format(body, nmea_checksum(body + '*'))
+            lines.append('{:.3f} {}\n'.format(start_time + i * interval, text))
+    return lines
+
+
+class Benchmark:
+    """
+    Something to time. The setup function gets the corpus and returns the
+    argument for run, so that work like pre-parsing stays out of the timing;
+    run returns how many items it processed.
+    """
+
+    def __init__(self, name, run, setup=None):
+        self.name = name
+        self.run = run
+        self.setup = setup or (lambda corpus: corpus)
+
+    def measure(self, corpus, repeat):
+        best = None
+        items = 0
+        for _ in range(repeat):
+            argument = self.setup(corpus)
+            start = time.perf_counter()
+            items = self.run(argument)
+            duration = time.perf_counter() - start
+            if best is None or duration < best:
+                best = duration
+        return {'name': self.name, 'seconds': best, 'items': items,
+                'per_second': items / best if best else None}
+
+
+class Corpus:
+    def __init__(self, lines, directory):
+        self.lines = lines
+        self.directory = directory
+        self.path = os.path.join(directory, 'corpus.ais')
+        with open(self.path, 'w') as f:
+            f.writelines(lines)
+
+
+def _sentences(lines):
+    parser = StreamParser()
+    result = []
+    for line in lines:
+        parser.add(line)
+        while parser.has_sentence():
+            result.append(parser.next_sentence())
+    return result
+
+
+def _fragments(corpus):
+    return [f for f in (parse_one(line) for line in corpus.lines) if isinstance(f, simpleais.SentenceFragment)]
+
+
+def _parse_all(corpus):
+    for line in corpus.lines:
+        parse_one(line)
+    return len(corpus.lines)
+
+
+def _stream_all(corpus, raw=False):
+    parser = StreamParser(raw=raw)
+    count = 0
+    for line in corpus.lines:
+        parser.add(line)
+        while parser.has_sentence():
+            parser.next_sentence()
+            count += 1
+    return count
+
+
+def _reassemble(fragments):
+    pools = {}
+    count = 0
+    for fragment in fragments:
+        pool = pools.setdefault(fragment.key(), simpleais.FragmentPool())
+        pool.add(fragment)
+        if pool.has_full_sentence():
+            pool.pop_full_sentence()
+            count += 1
+    return count
+
+
+def _decode_fields(sentences):
+    for sentence in sentences:
+        sentence.field_values()
+    return len(sentences)
+
+
+def _render_json(sentences):
+    for sentence in sentences:
+        sentence.as_json()
+    return len(sentences)
+
+
+def library_benchmarks(type_ids):
+    result = [
+        Benchmark('parse_one', _parse_all),
+        Benchmark('StreamParser.add', _stream_all),
+        Benchmark('StreamParser.add raw', functools.partial(_stream_all, raw=True)),
+        Benchmark('fragment reassembly', _reassemble, _fragments),
+    ]
+    for type_id in sorted(type_ids):
+        result.append(Benchmark('decode type {}'.format(type_id), _decode_fields,
+                                lambda corpus, t=type_id: [s for s in _sentences(corpus.lines) if s.type_id() == t]))
+    result.append(Benchmark('as_json', _render_json, lambda corpus: _sentences(corpus.lines)))
+    return result
+
+
+def _run_command(command, arguments_for):
+    def run(corpus):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+                contextlib.redirect_stderr(devnull):
+            command.main(args=arguments_for(corpus), standalone_mode=False)
+        return len(corpus.lines)
+
+    return run
+
+
+def _fresh_directory(corpus):
+    directory = tempfile.mkdtemp(dir=corpus.directory)
+    corpus.output = os.path.join(directory, 'out')
+    return corpus
+
+
+def tool_benchmarks():
+    commands = [
+        ('aiscat', tools.cat, lambda c: [c.path]),
+        ('aisgrep', tools.grep, lambda c: [c.path, '--type', '5']),
+        ('aisgrep --checksum', tools.grep, lambda c: [c.path, '--checksum', 'invalid']),
+        ('aist', tools.as_text, lambda c: [c.path]),
+        ('aisburst', tools.burst, lambda c: [c.path, c.output + '.ais']),
+        ('aisinfo', tools.info, lambda c: [c.path]),
+        ('aisinfo -i', tools.info, lambda c: [c.path, '--individual']),
+        ('aisinfo --map', tools.info, lambda c: [c.path, '--map']),
+        ('aisdump', tools.dump, lambda c: [c.path]),
+        ('aisstat', tools.stat, lambda c: [c.path, '--field', 'type']),
+        ('aisstat -a', tools.stat, lambda c: [c.path, '--field', 'mmsi', '--approximate']),
+        ('aisrefine', tools.refine, lambda c: [c.path]),
+        ('ais2json', tools.to_json, lambda c: [c.path]),
+        ('ais2columns', tools.to_columns, lambda c: [c.path, '--output', c.output + '.npz']),
+    ]
+    return [Benchmark(name, _run_command(command, arguments_for), _fresh_directory)
+            for name, command, arguments_for in commands]
+
+
+def sentence_memory(corpus):
+    """ Returns the bytes allocated per sentence when the whole corpus is held in memory. """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        sentences = _sentences(corpus.lines)
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'sentences': len(sentences), 'bytes_per_sentence': allocated / len(sentences)}
+
+
+def compare(results, baseline, threshold):
+    """ Returns descriptions of benchmarks more than threshold times slower, or bigger, than in baseline. """
+    previous = {b['name']: b for b in baseline['benchmarks']}
+    slower = []
+    for benchmark in results['benchmarks']:
+        before = previous.get(benchmark['name'])
+        if before and before['seconds'] and benchmark['seconds'] > before['seconds'] * threshold:
+            slower.append("{}: {:.4f}s, was {:.4f}s ({:.2f}x)".format(
+                benchmark['name'], benchmark['seconds'], before['seconds'], benchmark['seconds'] / before['seconds']))
+    memory, before = results.get('memory'), baseline.get('memory')
+    if memory and before and memory['bytes_per_sentence'] > before['bytes_per_sentence'] * threshold:
+        slower.append("memory: {:.0f} bytes per sentence, was {:.0f}".format(memory['bytes_per_sentence'],
+                                                                           before['bytes_per_sentence']))
+    return slower
+
+
+@click.command()
+@click.option('--count', '-n', type=int, default=10000, help="messages in the synthetic corpus")
+@click.option('--mix', default=DEFAULT_MIX, help="message types and weights, like 1:40,5:10")
+@click.option('--seed', type=int, default=0)
+@click.option('--vessels', type=int, default=200, help="distinct MMSIs in the corpus")
+@click.option('--repeat', '-r', type=int, default=3, help="runs per benchmark; the best is kept")
+@click.option('--only', '-k', multiple=True, help="run benchmarks whose names contain this")
+@click.option('--skip-tools', is_flag=True)
+@click.option('--skip-memory', is_flag=True)
+@click.option('--output', '-o', help="write results as JSON to this file")
+@click.option('--compare', 'baseline', help="JSON results to check for regressions against")
+@click.option('--threshold', type=float, default=1.2, help="slowdown ratio that counts as a regression")
+def main(count, mix, seed, vessels, repeat, only, skip_tools, skip_memory, output, baseline, threshold):
+    mix = parse_mix(mix)
+    benchmarks = library_benchmarks(mix.keys())
+    if not skip_tools:
+        benchmarks += tool_benchmarks()
+    if only:
+        benchmarks = [b for b in benchmarks if any(o in b.name for o in only)]
+
+    results = {
+        'simpleais': simpleais.__file__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': {'count': count, 'mix': mix, 'seed': seed, 'vessels': vessels},
+        'benchmarks': [],
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = Corpus(synthetic_lines(count, mix, seed, vessels), directory)
+        results['corpus']['lines'] = len(corpus.lines)
+        print("{} messages in {} lines".format(count, len(corpus.lines)))
+        for benchmark in benchmarks:
+            result = benchmark.measure(corpus, repeat)
+            results['benchmarks'].append(result)
+            print("{:24s} {:9.4f}s {:12,.0f}/s".format(result['name'], result['seconds'], result['per_second'] or 0))
+        if not skip_memory:
+            results['memory'] = sentence_memory(corpus)
+            print("{:24s} {:9.0f} bytes per sentence".format('memory', results['memory']['bytes_per_sentence']))
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if baseline:
+        with open(baseline) as f:
+            slower = compare(results, json.load(f), threshold)
+        for line in slower:
+            print("regression: " + line)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
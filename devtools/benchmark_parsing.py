@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import simpleais
+from simpleais import aivdm_pattern, _sentence_parts
+
+
+# Times splitting lines into sentence parts, and parse_one as a whole, using the
+# sample data in tests/. Pass a different AIS file to use that instead.
+#
+# Two alternatives are kept for comparison: the previous post-processing, which
+# split the matched message on '*' and then ','; and a hand-written path that
+# checks the structure with a split and set lookups, falling back to the regex
+# for odd lines. On CPython the compiled regex search costs about as much as the
+# cheapest string operations that still reject bad lines, so the hand-written
+# path has come out no faster and stays out of the library.
+
+_fills_and_checksums = frozenset('{}*{:02X}'.format(fill, checksum) for fill in range(7) for checksum in range(256))
+_header_pattern = re.compile(r'[A-Z]{5},\d,\d,[^*\n]?,[AB12]?')
+_valid_headers = set()
+
+
+def split_sentence_parts(string):
+    m = aivdm_pattern.search(string)
+    if not m:
+        return None
+    message = m.group(2)
+    content, checksum = message[1:].split('*')
+    return m.group(1), message, checksum, content.split(',')
+
+
+def string_sentence_parts(string):
+    lead, _, rest = string.partition('!')
+    fields = rest.split(',')
+    if len(fields) == 7:
+        tail = fields[6].rstrip()
+        header = (fields[0], fields[1], fields[2], fields[3], fields[4])
+        if header not in _valid_headers and _header_pattern.fullmatch(','.join(header)):
+            _valid_headers.add(header)
+        time_text = lead.rstrip()
+        if tail in _fills_and_checksums and header in _valid_headers and fields[5] and '*' not in fields[5] and \
+                not time_text.strip('.0123456789'):
+            fields[6] = tail[0]
+            return time_text or None, '!' + rest.rstrip(), tail[2:], fields
+    return _sentence_parts(string)
+
+
+def best_of(function, lines, number=5, repeat=15):
+    return min(timeit.repeat(lambda: [function(line) for line in lines], number=number, repeat=repeat)) / number
+
+
+source = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), '..', 'tests', 'sample.ais')
+with open(source) as f:
+    lines = f.readlines()
+candidates = [('split on *', split_sentence_parts), ('string ops', string_sentence_parts)]
+
+print("{} lines".format(len(lines)))
+for name, candidate in candidates:
+    mismatches = sum(1 for line in lines if candidate(line) != _sentence_parts(line))
+    if mismatches:
+        print("{}: {} lines split differently".format(name, mismatches))
+
+current_time = best_of(_sentence_parts, lines)
+print("splitting, current:    {:.4f}s".format(current_time))
+for name, candidate in candidates:
+    candidate_time = best_of(candidate, lines)
+    print("splitting, {:11s} {:.4f}s (current is {:.2f}x faster)".format(name + ':', candidate_time,
+                                                                         candidate_time / current_time))
+
+parse_time = best_of(simpleais.parse_one, lines)
+print("parse_one, current:    {:.4f}s".format(parse_time))
+for name, candidate in candidates:
+    simpleais._sentence_parts = candidate
+    candidate_time = best_of(simpleais.parse_one, lines)
+    simpleais._sentence_parts = _sentence_parts
+    print("parse_one, {:11s} {:.4f}s (current is {:.2f}x faster)".format(name + ':', candidate_time,
+                                                                         candidate_time / parse_time))
@@ -15,12 +15,14 @@ setup(name='simpleais',
       install_requires=['bitstring', 'testfixtures', 'Click<8.1.3', 'numpy', 'python-dateutil'],
       extras_require={
           'dev': ['beautifulsoup4', 'nose'],  # if you'll be developing, you may need this
+          'parquet': ['pyarrow'],  # for ais2columns --format parquet
       },
       package_data={'simpleais': ['aivdm.json']},
       entry_points={
           'console_scripts': [
               'aiscat = simpleais.tools:cat',
               'aisgrep = simpleais.tools:grep',
+              'aisindex = simpleais.tools:index',
               'aist = simpleais.tools:as_text',
               'aisburst = simpleais.tools:burst',
               'aisinfo = simpleais.tools:info',
@@ -28,6 +30,7 @@ setup(name='simpleais',
               'aisstat = simpleais.tools:stat',
               'aisrefine = simpleais.tools:refine',
               'ais2json = simpleais.tools:to_json',
+              'ais2columns = simpleais.tools:to_columns',
           ],
       },
       )
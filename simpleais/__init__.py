@@ -3,13 +3,28 @@ import collections
 import gzip
 import json
 import logging
+import operator
 import os
+import queue
 import re
 import time
-from functools import reduce
+import urllib.parse
+from functools import lru_cache, reduce
 from io import TextIOBase
 
-aivdm_pattern = re.compile(r'([.0-9]+)?\s*(![A-Z]{5},\d,\d,.?,[AB12]?,[^,]+,[0-6]\*[0-9A-F]{2})')
+aivdm_pattern = re.compile(r'([.0-9]+)?\s*(![A-Z]{5},\d,\d,[^*\n]?,[AB12]?,[^,*]+,[0-6]\*[0-9A-F]{2})')
+
+# the same, for scanning whole buffers of bytes; it finds at most the first sentence on each line
+aivdm_bytes_pattern = re.compile(
+    rb'(?m)^[^\n]*?([.0-9]+)?[ \t\f\v]*(![A-Z]{5},[0-9],[0-9],[^*\n]?,[AB12]?,[^,*\r\n]+,[0-6]\*[0-9A-F]{2})')
+
+# seconds a partly-received multi-fragment message waits for the rest, and how many can wait at once
+FRAGMENT_TIMEOUT = 60
+MAX_FRAGMENT_GROUPS = 1000
+
+# seconds within which a repeated payload counts as the same transmission, and how many payloads to remember
+DUPLICATE_WINDOW = 10
+DUPLICATE_HISTORY = 100000
 
 
 class Bits:
@@ -107,37 +122,157 @@ class Bits:
         return Bits(result_value, result_length)
 
 
+class DuplicateFilter:
+    """
+    Remembers recently seen payloads, so that a transmission heard by several
+    receivers is only passed on once. Payloads are remembered for the window
+    in seconds, and at most size of them at a time, oldest forgotten first.
+    One filter can be shared by the parsers for several sources.
+    """
+
+    def __init__(self, window=DUPLICATE_WINDOW, size=DUPLICATE_HISTORY):
+        self.window = window
+        self.size = size
+        self.duplicate_count = 0
+        self._times = {}
+        self._history = collections.deque()
+
+    def is_duplicate(self, payload, now):
+        times = self._times
+        history = self._history
+        while history and now - times[history[0]] > self.window:
+            del times[history.popleft()]
+        seen = times.get(payload)
+        if seen is not None and abs(now - seen) <= self.window:
+            self.duplicate_count += 1
+            return True
+        if seen is None:
+            if len(history) >= self.size:
+                del times[history.popleft()]
+            history.append(payload)
+        times[payload] = now
+        return False
+
+
 class StreamParser:
     """
-    Used to parse live streams of AIS messages.
+    Used to parse live streams of AIS messages. With drop_invalid, sentences
+    and fragments with bad checksums are counted and dropped before anything
+    else is done with them.
     """
 
-    def __init__(self, default_to_current_time=False, log_errors=False):
-        self.fragment_pool = collections.defaultdict(FragmentPool)
+    def __init__(self, default_to_current_time=False, log_errors=False, payload_filter=None,
+                 fragment_timeout=FRAGMENT_TIMEOUT, max_fragment_groups=MAX_FRAGMENT_GROUPS, duplicate_filter=None,
+                 raw=False, drop_invalid=False):
+        self.fragment_pool = collections.OrderedDict()
+        self.fragment_timeout = fragment_timeout
+        self.max_fragment_groups = max_fragment_groups
+        self.dropped_fragment_count = 0
+        self.expired_fragment_count = 0
+        self.duplicate_filter = duplicate_filter
+        self.raw = raw
+        self.drop_invalid = drop_invalid
+        self.invalid_count = 0
         self.sentence_buffer = collections.deque()
         self.default_to_current_time = default_to_current_time
         self.log_errors = log_errors
+        self.payload_filter = payload_filter
+        self.filtered_count = 0
+        self._filtered_key = None
+
+    def _filtered(self, fields):
+        """
+        Checks the payload of a sentence or initial fragment against the payload
+        filter, dropping the rest of a multi-fragment message if its first part
+        is rejected.
+        """
+        if fields[1] == '1' or fields[2] == '1':
+            if self.payload_filter(fields[5]):
+                self._filtered_key = None
+                return False
+            self.filtered_count += 1
+            self._filtered_key = (fields[0], fields[1], fields[3], fields[4]) if fields[1] != '1' else None
+            return True
+        return self._filtered_key == (fields[0], fields[1], fields[3], fields[4])
 
     def add(self, message_text):
-        thing = parse_one(message_text, self.default_to_current_time)
+        self._add_parts(_sentence_parts(message_text), message_text)
+
+    def _add_parts(self, parts, message_text):
+        valid = None
+        if parts and self.drop_invalid:
+            valid = _checksum_valid(parts[1], parts[2])
+            if not valid:
+                self.invalid_count += 1
+                return
+        if parts and self.payload_filter and self._filtered(parts[3]):
+            return
+        if parts and self.duplicate_filter and parts[3][1] == '1' and \
+                self.duplicate_filter.is_duplicate(parts[3][5], float(parts[0]) if parts[0] else time.time()):
+            return
+        if self.raw and parts:
+            time_text, message, _, fields = parts
+            if fields[2] == '1' and fields[5][0] not in _int_lookup:
+                parts = None  # no message type, so skipped just as decoding would
+            elif fields[1] == '1':
+                self.sentence_buffer.append(
+                    RawSentence([message], _time_for(time_text, self.default_to_current_time), fields[5]))
+                return
+        thing = _parse_parts(parts, self.default_to_current_time, valid)
         if isinstance(thing, Sentence):
             self.sentence_buffer.append(thing)
         elif isinstance(thing, SentenceFragment):
-            pool = self.fragment_pool[thing.radio_channel]
-            pool.add(thing)
-            if pool.has_full_sentence():
-                sentence = pool.pop_full_sentence()
-                self.sentence_buffer.append(sentence)
+            self._add_fragment(thing)
         else:
             if self.log_errors:
                 logging.getLogger().warning("skipped: \"{}\"".format(message_text.strip()))
 
+    def _add_fragment(self, fragment):
+        """
+        Reassembles fragments per message key, so that interleaved multi-part
+        messages from different stations don't spoil one another. Groups are
+        kept least recently updated first; stale ones expire, and the oldest is
+        dropped when too many are in flight.
+        """
+        now = fragment.time if fragment.time is not None else time.time()
+        self._expire_fragments(now)
+        key = fragment.key()
+        pool = self.fragment_pool.get(key)
+        if pool is None:
+            if len(self.fragment_pool) >= self.max_fragment_groups:
+                _, oldest = self.fragment_pool.popitem(last=False)
+                self.dropped_fragment_count += len(oldest.fragments)
+            pool = self.fragment_pool[key] = FragmentPool(RawSentence if self.raw else Sentence)
+        else:
+            self.fragment_pool.move_to_end(key)
+        self.dropped_fragment_count += pool.add(fragment)
+        pool.updated = now
+        if pool.has_full_sentence():
+            del self.fragment_pool[key]
+            sentence = pool.pop_full_sentence()
+            if self.duplicate_filter and \
+                    self.duplicate_filter.is_duplicate(sentence.payload_text if self.raw else
+                                                       ''.join(lump.ascii for lump in sentence.payload.data), now):
+                return
+            self.sentence_buffer.append(sentence)
+
+    def _expire_fragments(self, now):
+        while self.fragment_pool:
+            key, pool = next(iter(self.fragment_pool.items()))
+            if now - pool.updated <= self.fragment_timeout:
+                return
+            del self.fragment_pool[key]
+            self.expired_fragment_count += len(pool.fragments)
+
     def next_sentence(self):
         return self.sentence_buffer.popleft()
 
     def has_sentence(self):
         return len(self.sentence_buffer) > 0
 
+    def has_partial_sentence(self):
+        return any(len(pool.fragments) > 0 for pool in self.fragment_pool.values())
+
 
 def parse_many(messages):
     p = StreamParser()
@@ -152,41 +287,81 @@ def parse_many(messages):
 # based on https://en.wikipedia.org/wiki/NMEA_0183
 def nmea_checksum(message):
     content = message[1:].split('*')[0]
-    result = 0
-    for c in content:
-        result = result ^ ord(c)
-    return result
+    return reduce(operator.xor, content.encode('utf-8', errors='replace'), 0)
 
 
-def parse_one(string, default_to_current_time=False):
+_checksum_texts = ['{:02X}'.format(n) for n in range(256)]
+
+
+def _checksum_valid(message, checksum):
+    """
+    Checks a message that matched aivdm_pattern, so ends with '*' and two
+    upper-case hex digits, against that checksum text. XORing the encoded bytes
+    and comparing text is much quicker than a loop of ord() and int(c, 16).
+    """
+    return _checksum_texts[reduce(operator.xor, message[1:-3].encode('utf-8', errors='replace'), 0)] == checksum
+
+
+def _sentence_parts(string):
+    """
+    Splits a line into its timestamp text (or None), NMEA message, checksum,
+    and comma-separated fields, without building any objects. The pattern fixes
+    the checksum's position, so the message is sliced rather than split on '*'.
+    """
     m = aivdm_pattern.search(string)
     if not m:
         return None
+    time_text, message = m.groups()
+    return time_text, message, message[-2:], message[1:-3].split(',')
+
+
+def type_and_mmsi(payload):
+    """
+    Returns the message type and MMSI from the first 7 characters of an armored
+    payload, or None if it is too short or has characters that aren't armor.
+    """
+    if len(payload) < 7:
+        return None
+    try:
+        value = int(payload[:7].translate(_octal_table), 8)
+    except ValueError:
+        return None
+    return value >> 36, value >> 4 & 0x3FFFFFFF
+
 
-    if m.group(1):
-        sentence_time = float(m.group(1))
+def parse_one(string, default_to_current_time=False):
+    return _parse_parts(_sentence_parts(string), default_to_current_time)
+
+
+def _time_for(time_text, default_to_current_time=False):
+    if time_text:
+        return float(time_text)
+    elif default_to_current_time:
+        return time.time()
     else:
-        if default_to_current_time:
-            sentence_time = time.time()
-        else:
-            sentence_time = None
+        return None
+
 
-    message = m.group(2)
+def _parse_parts(parts, default_to_current_time=False, valid=None):
+    if not parts:
+        return None
+    time_text, message, checksum, fields = parts
+    sentence_time = _time_for(time_text, default_to_current_time)
+    if valid is None:
+        valid = _checksum_valid(message, checksum)
 
-    content, checksum = message[1:].split('*')
-    fields = content.split(',')
     talker = fields[0][0:2]
     sentence_type = fields[0][2:]
     fragment_count = int(fields[1])
     radio_channel = fields[4]
     payload = NmeaPayload(fields[5], int(fields[6]))
     if fragment_count == 1:
-        return Sentence(talker, sentence_type, radio_channel, payload, [checksum], sentence_time, [message])
+        return Sentence(talker, sentence_type, radio_channel, payload, checksum, sentence_time, message, valid)
     else:
         fragment_number = int(fields[2])
         message_id = fields[3]
         return SentenceFragment(talker, sentence_type, fragment_count, fragment_number,
-                                message_id, radio_channel, payload, checksum, sentence_time, message)
+                                message_id, radio_channel, payload, checksum, sentence_time, message, valid)
 
 
 def parse(message):
@@ -231,6 +406,8 @@ _bits_lookup, _int_lookup = _make_nmea_lookup_tables()
 
 
 class NmeaLump:
+    __slots__ = ('ascii', 'fill', '_length')
+
     def __init__(self, raw_data, fill_bits=0):
         if not isinstance(raw_data, str):
             raise ValueError("don't like a {}".format(raw_data))
@@ -295,46 +472,121 @@ class NmeaLump:
         return "NmeaLump('{}', {})".format(self.ascii, self.fill)
 
 
+def _make_octal_table():
+    # each armored character is 6 bits, which is exactly two octal digits
+    return str.maketrans({c: "{:02o}".format(n) for c, n in _int_lookup.items()})
+
+
+_octal_table = _make_octal_table()
+
+
+def _armored_int(ascii_representation):
+    """
+    Returns the armored text as an int, plus a mask of the bits from any
+    characters that aren't armor; those bits are zero in the int.
+    """
+    try:
+        return int(ascii_representation.translate(_octal_table), 8), 0
+    except ValueError:
+        value = 0
+        bad = 0
+        for c in ascii_representation:
+            n = _int_lookup.get(c)
+            value = value << 6 | (n or 0)
+            bad = bad << 6 | (0 if n is not None else 0x3F)
+        return value, bad
+
+# armored characters straight to the text characters their six bits spell, for byte-aligned text fields
+_armored_text_table = str.maketrans({c: chr(n if n > 31 else n + 64) for c, n in _int_lookup.items()})
+
+
 # noinspection PyCallingNonCallable
 class NmeaPayload:
     """
-    Represents the heart of an AIS message plus related decoding.
+    Represents the heart of an AIS message plus related decoding. The armored
+    text is converted to a single int the first time any bits are needed, so
+    that field extraction is just a shift and a mask. Bits from characters
+    that aren't armor are marked, and asking for them raises ValueError.
+
+    Most payloads come from a single fragment, so those keep just the armored
+    text and fill bits; only joined payloads hold a list of NmeaLumps.
     """
+    __slots__ = ('_ascii', '_fill', '_lumps', '_value', '_length', '_bad')
 
     def __init__(self, raw_data, fill_bits=0):
         if isinstance(raw_data, Bits):
             raise NotImplementedError
-        elif isinstance(raw_data, Bits):
-            self.data = raw_data
         elif isinstance(raw_data, str):
-            self.data = [NmeaLump(raw_data, fill_bits)]
+            self._ascii = raw_data
+            self._fill = fill_bits
+            self._lumps = None
         elif isinstance(raw_data, list) and isinstance(raw_data[0], NmeaLump):
-            self.data = raw_data
+            self._ascii = None
+            self._fill = None
+            self._lumps = raw_data
         else:
             raise ValueError("Don't like a {}".format(raw_data))
+        self._value = None
+        self._length = None
+        self._bad = 0
+
+    @property
+    def data(self):
+        if self._lumps is None:
+            return [NmeaLump(self._ascii, self._fill)]
+        return self._lumps
+
+    def _first_character(self):
+        return self._ascii[0] if self._lumps is None else self._lumps[0].ascii[0]
+
+    def _unpack(self):
+        if self._lumps is None:
+            if self._ascii:
+                value, bad = _armored_int(self._ascii)
+                self._value = value >> self._fill
+                self._bad = bad >> self._fill
+            else:
+                self._value = 0
+            self._length = 6 * len(self._ascii) - self._fill
+            return
+        value = 0
+        bad = 0
+        length = 0
+        for lump in self._lumps:
+            lump_length = lump.bit_length()
+            value <<= lump_length
+            bad <<= lump_length
+            if lump.ascii:
+                lump_value, lump_bad = _armored_int(lump.ascii)
+                value |= lump_value >> lump.fill
+                bad |= lump_bad >> lump.fill
+            length += lump_length
+        self._value = value
+        self._bad = bad
+        self._length = length
+
+    def as_int(self):
+        if self._value is None:
+            self._unpack()
+        return self._value
 
     def unsigned_int(self, start, end):
-        return int(self._bit_range(start, end))
+        return self.int_for_bit_range(start, end)
 
     @property
     def bits(self):
-        return Bits.join([l.bits() for l in self.data])
-
-    @staticmethod
-    def _bits_for(ascii_representation, fill_bits):
-        result = []
-        for pos in range(0, len(ascii_representation) - 1):
-            result.append(_bits_lookup[ascii_representation[pos]])
-        bits_at_end = 6 - fill_bits
-        selected_bits = _bits_lookup[ascii_representation[-1]][0:bits_at_end]
-        result.append(selected_bits)
-        return Bits.join(result)
+        return Bits(self.as_int(), self.bit_length())
 
     def __len__(self):
         return self.bit_length()
 
     def bit_length(self):
-        return sum([l.bit_length() for l in self.data])
+        if self._length is None:
+            if self._lumps is None:
+                self._length = 6 * len(self._ascii) - self._fill
+            else:
+                self._length = sum([l.bit_length() for l in self._lumps])
+        return self._length
 
     @classmethod
     def join(cls, items):
@@ -344,64 +596,35 @@ class NmeaPayload:
         return NmeaPayload(l)
 
     def has_bits(self, start, stop):
-        return start >= 0 and stop < self.bit_length()
+        return start >= 0 and stop <= self.bit_length()
+
+    def _int_and_length(self, start, stop):
+        # like slicing Bits, ranges past the end are cut short
+        value = self.as_int()
+        length = self.bit_length()
+        start = min(start, length)
+        stop = min(stop, length)
+        mask = (1 << (stop - start)) - 1
+        if self._bad and self._bad >> (length - stop) & mask:
+            raise ValueError("bits {} to {} of {} aren't all armored characters".format(start, stop, self))
+        return value >> (length - stop) & mask, stop - start
 
     def int_for_bit_range(self, start, stop):
-        # Can we pull from the first lump?
-        if stop <= self.data[0].bit_length():
-            return self.data[0].int_for_bit_range(start, stop)
-
-        # most ints are in the first lump, so ignore other complexity for now
-        return int(self._bit_range(start, stop))
-
-    def _twos_comp(self, val, length):
-        if (val & (1 << (length - 1))) != 0:  # if sign bit is set e.g., 8bit: 128-255
-            val = val - (1 << length)  # compute negative value
-        return val
+        return self._int_and_length(start, stop)[0]
 
     def scaled_int_for_bit_range(self, start, stop, scale):
-        out = self._twos_comp(self.int_for_bit_range(start, stop), stop - start)
-        return round(out / 60 / (10 ** scale), 4)
+        return _scaled(self.int_for_bit_range(start, stop), stop - start, scale)
 
     def text_for_bit_range(self, start, stop):
-        bits = self._bit_range(start, stop)
-
-        def chunks(s, n):
-            for i in range(0, len(s), n):
-                yield s[i:i + n]
-
-        raw_ints = [int(nibble) for nibble in chunks(bits, 6)]
-        mapped_ints = [i if i > 31 else i + 64 for i in raw_ints]
-        text = ''.join([chr(i) for i in mapped_ints]).strip()
-        text = text.rstrip('@').strip()
-        return text
+        if self._lumps is None and start % 6 == 0 and stop % 6 == 0 and stop <= self.bit_length():
+            if self._value is None:
+                self._unpack()
+            if not self._bad:
+                return _clean_text(self._ascii[start // 6:stop // 6].translate(_armored_text_table))
+        return _text_for_int(*self._int_and_length(start, stop))
 
     def _bit_range(self, start, stop):
-        # Can we pull from the first lump?
-        if stop <= self.data[0].bit_length():
-            return self.data[0].bit_range(start, stop)
-        # Can we pull from any single lump?
-        result = self._quick_bit_range(start, stop)
-        if result:
-            return result
-        # Damn. Convert it all to bits. // TODO: make faster?
-        return self._full_bit_range(start, stop)
-
-    def _quick_bit_range(self, start, stop):
-        pos = 0
-        offset = 0
-        end = len(self.data)
-        while pos < end:
-            lump = self.data[pos]
-            if offset <= start and stop <= offset + lump.bit_length():
-                return lump.bit_range(start - offset, stop - offset)
-            else:
-                offset += lump.bit_length()
-                pos += 1
-        return None
-
-    def _full_bit_range(self, start, stop):
-        return Bits.join([l.bits() for l in self.data])[start:stop]
+        return Bits(*self._int_and_length(start, stop))
 
     def __repr__(self):
         return "NmeaPayload({})".format(self.data.__repr__())
@@ -421,6 +644,80 @@ class FieldDecoder:
         raise NotImplementedError
 
 
+def _twos_comp(val, length):
+    if (val & (1 << (length - 1))) != 0:  # if sign bit is set e.g., 8bit: 128-255
+        val = val - (1 << length)  # compute negative value
+    return val
+
+
+def _scaled(val, length, scale):
+    return round(_twos_comp(val, length) / 60 / (10 ** scale), 4)
+
+
+def _valid_lon(lon):
+    if lon != 181.0 and -180.0 <= lon <= 180.0:
+        return lon
+
+
+def _valid_lat(lat):
+    if lat != 91.0 and -90.0 <= lat <= 90.0:
+        return lat
+
+
+# MMSIs repeat constantly, so each is formatted once and the same string handed out after that
+_mmsi_texts = {}
+_MMSI_TEXTS_LIMIT = 1 << 20
+_enum_texts = {}
+
+
+def _mmsi_text(mmsi):
+    try:
+        return _mmsi_texts[mmsi]
+    except KeyError:
+        if len(_mmsi_texts) >= _MMSI_TEXTS_LIMIT:
+            _mmsi_texts.clear()  # only garbled data should get here
+        text = _mmsi_texts[mmsi] = "%09i" % mmsi
+        return text
+
+
+def _enum_text(val):
+    try:
+        return _enum_texts[val]
+    except KeyError:
+        text = _enum_texts[val] = "enum-{}".format(val)
+        return text
+
+
+# six-bit text characters by the two octal digits that spell their value
+_octal_pair_text = {"{:02o}".format(n): chr(n if n > 31 else n + 64) for n in range(64)}
+TEXT_CACHE_SIZE = 4096
+
+
+def _clean_text(text):
+    return text.strip().rstrip('@').strip()
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def _text_for_int(val, length):
+    """
+    Decodes six-bit text from the field's bits as an int. Names, call signs,
+    and destinations repeat constantly, so recent results are kept.
+    """
+    if length % 6 or not length:
+        return _text_for_ragged_int(val, length)
+    octal = "{:0{}o}".format(val, length // 3)
+    return _clean_text(''.join([_octal_pair_text[octal[i:i + 2]] for i in range(0, len(octal), 2)]))
+
+
+def _text_for_ragged_int(val, length):
+    chars = []
+    for offset in range(0, length, 6):
+        size = min(6, length - offset)
+        i = val >> (length - offset - size) & ((1 << size) - 1)
+        chars.append(chr(i if i > 31 else i + 64))
+    return _clean_text(''.join(chars))
+
+
 class BitFieldDecoder(FieldDecoder):
     def __init__(self, name, start, end, data_type, description):
         self.name = name
@@ -429,50 +726,63 @@ class BitFieldDecoder(FieldDecoder):
         self.length = 1 + end - start
         self.bit_range = slice(start, end + 1)
         self.description = description
+        self.data_type = data_type
+        self.convert = self._appropriate_int_decoder(data_type, name)
         self._nmea_decode = self._appropriate_nmea_decoder(data_type, name)
         self.short_bits_ok = data_type in ['s', 't', 'd']  # if we get partial text or data, that's better than nothing
 
     def __repr__(self, *args, **kwargs):
         return "FieldDecoder({}, {}, {}, {})".format(self.name, self.description, self.start, self.end)
 
-    def _appropriate_nmea_decoder(self, data_type, name):
+    def _appropriate_int_decoder(self, data_type, name):
+        """
+        Returns a function turning the raw unsigned int for this field, plus its
+        length in bits, into the field's value.
+        """
         if name == 'mmsi':
-            return self._parse_mmsi
+            return lambda i, l: _mmsi_text(i)
         elif name == 'lon' and data_type == 'I4':
-            return self._parse_lon
+            return lambda i, l: _valid_lon(_scaled(i, l, 4))
         elif name == 'lat' and data_type == 'I4':
-            return self._parse_lat
+            return lambda i, l: _valid_lat(_scaled(i, l, 4))
         elif name.endswith('lon') and data_type == 'I1':
-            return self._parse_lon_coarse
+            return lambda i, l: _valid_lon(_scaled(i, l, 1))
         elif name.endswith('lat') and data_type == 'I1':
-            return self._parse_lat_coarse
+            return lambda i, l: _valid_lat(_scaled(i, l, 1))
         elif data_type == 't' or data_type == 's':
-            return self._parse_text
+            return _text_for_int
         elif data_type == 'I1':
-            return lambda p: self.scaled_int(p, 1)
+            return lambda i, l: _scaled(i, l, 1)
         elif data_type == 'I3':
-            return lambda p: self.scaled_int(p, 3)
+            return lambda i, l: _scaled(i, l, 3)
         elif data_type == 'I4':
-            return lambda p: self.scaled_int(p, 4)
-        elif data_type == 'u':
-            return self.int
+            return lambda i, l: _scaled(i, l, 4)
+        elif data_type == 'u' or data_type == 'x':
+            return lambda i, l: i
         elif data_type == 'U1':
-            return lambda p: self.int(p) / 10.0
+            return lambda i, l: i / 10.0
         elif data_type == 'd':
-            return lambda p: p.bits[self.start:self.end + 1]
+            return Bits
         elif data_type == 'e':
             if name in ['status', 'shiptype']:
-                def lookup(p):
-                    i = self.int(p)
+                def lookup(i, l):
                     if i not in ENUM_LOOKUPS[name]:
                         ENUM_LOOKUPS[name][i] = AisEnum(i, "enum-unknown-{}".format(i))
                     return ENUM_LOOKUPS[name][i]
                 return lookup
-            return lambda p: "enum-{}".format(self.int(p))  # TODO: find and include enumerated types
+            return lambda i, l: _enum_text(i)  # TODO: find and include enumerated types
         elif data_type == 'b':
-            return lambda p: self.int(p) == 1
-        elif data_type == 'x':
-            return self.int
+            return lambda i, l: i == 1
+
+    def _appropriate_nmea_decoder(self, data_type, name):
+        if name in ('lon', 'lat') and data_type == 'I4' or name.endswith(('lon', 'lat')) and data_type == 'I1':
+            return self._parse_coordinate
+        elif data_type == 't' or data_type == 's':
+            return self._parse_text
+        elif data_type == 'd':
+            return lambda p: p._bit_range(self.start, self.end + 1)
+        else:
+            return lambda p: self.convert(self.int(p), self.length)
 
     def int(self, payload):
         return payload.int_for_bit_range(self.start, self.end + 1)
@@ -484,7 +794,10 @@ class BitFieldDecoder(FieldDecoder):
         raise ValueError("Sorry, don't know how to parse '{}' for field '{}' yet".format(data_type, self.name))
 
     def decode(self, sentence):
-        return self._nmea_decode(sentence.payload)
+        try:
+            return self._nmea_decode(sentence.payload)
+        except ValueError:
+            return None  # the field's bits came from characters that aren't armor
 
     def bits(self, sentence):
         return sentence.message_bits()[self.bit_range]
@@ -492,36 +805,10 @@ class BitFieldDecoder(FieldDecoder):
     def valid(self, sentence):
         return len(sentence.message_bits()) > self.end
 
-    def _parse_mmsi(self, payload):
-        return "%09i" % payload.int_for_bit_range(self.start, self.end + 1)
-
-    def _parse_lon(self, payload):
+    def _parse_coordinate(self, payload):
         if not payload.has_bits(self.start, self.end + 1):
             return None
-        result = payload.scaled_int_for_bit_range(self.start, self.end + 1, 4)
-        if result is not None and result != 181.0 and -180.0 <= result <= 180.0:
-            return result
-
-    def _parse_lat(self, payload):
-        if not payload.has_bits(self.start, self.end + 1):
-            return None
-        result = payload.scaled_int_for_bit_range(self.start, self.end + 1, 4)
-        if result is not None and result != 91.0 and -90.0 <= result <= 90.0:
-            return result
-
-    def _parse_lon_coarse(self, payload):
-        if not payload.has_bits(self.start, self.end + 1):
-            return None
-        result = payload.scaled_int_for_bit_range(self.start, self.end + 1, 1)
-        if result is not None and result != 181.0 and -180.0 <= result <= 180.0:
-            return result
-
-    def _parse_lat_coarse(self, payload):
-        if not payload.has_bits(self.start, self.end + 1):
-            return None
-        result = payload.scaled_int_for_bit_range(self.start, self.end + 1, 1)
-        if result is not None and result != 91.0 and -90.0 <= result <= 90.0:
-            return result
+        return self.convert(self.int(payload), self.length)
 
     def _parse_text(self, payload):
         return payload.text_for_bit_range(self.start, self.end + 1)
@@ -566,6 +853,7 @@ class MessageDecoder:
     def __init__(self, message_info):
         self.field_decoders = []
         self.field_decoders_by_id = collections.OrderedDict()
+        self._decode_all = None
         for field in message_info['fields']:
             decoder = BitFieldDecoder(field['member'], field['start'], field['end'], field['type'],
                                       field['description'])
@@ -574,6 +862,50 @@ class MessageDecoder:
     def add_field_decoder(self, name, decoder):
         self.field_decoders.append(decoder)
         self.field_decoders_by_id[name] = decoder
+        self._decode_all = None
+
+    def compile(self):
+        """
+        Builds a function that decodes every field of a sentence in one pass over
+        the payload as a single int. Bit fields become precomputed stop/mask pairs;
+        derived fields and fields that run past the end of a short payload fall
+        back to their decoders. Fields with bits from characters that aren't
+        armor are None.
+        """
+        plan = []
+        for name, decoder in self.field_decoders_by_id.items():
+            if isinstance(decoder, BitFieldDecoder):
+                plan.append((name, decoder.end + 1, (1 << decoder.length) - 1, decoder.length,
+                             decoder.convert, decoder))
+            else:
+                plan.append((name, None, None, None, None, decoder))
+        plan = tuple(plan)
+
+        def decode_all(sentence):
+            value = sentence.payload.as_int()
+            bad = sentence.payload._bad
+            bit_length = sentence.payload.bit_length()
+            result = collections.OrderedDict()
+            for name, stop, mask, length, convert, decoder in plan:
+                if stop is not None and stop <= bit_length:
+                    if bad and bad >> (bit_length - stop) & mask:
+                        result[name] = None
+                    else:
+                        result[name] = convert(value >> (bit_length - stop) & mask, length)
+                else:
+                    try:
+                        result[name] = decoder.decode(sentence)
+                    except ValueError:
+                        result[name] = None
+            return result
+
+        self._decode_all = decode_all
+        return decode_all
+
+    def decode_all(self, sentence):
+        if self._decode_all is None:
+            self.compile()
+        return self._decode_all(sentence)
 
     def bit_range(self, name):
         return self.field_decoders_by_id[name].bit_range
@@ -636,6 +968,9 @@ def _load_decoders(source_file):
     # add derived fields
     message_result[4].add_field_decoder('time', TimeFieldDecoder())
 
+    for decoder in message_result.values():
+        decoder.compile()
+
     enum_result = {'shiptype': as_enums(loaded_json['lookups']['ship_type']),
                    'status': as_enums(loaded_json['lookups']['navigation_status'])}
     return message_result, enum_result
@@ -679,6 +1014,12 @@ BACKUP_DECODER = MessageDecoder({
 )
 
 
+def _unwrapped(strings):
+    if isinstance(strings, list) and len(strings) == 1 and isinstance(strings[0], str):
+        return strings[0]
+    return strings
+
+
 def _decoder_for_type(number):
     if number in MESSAGE_DECODERS:
         return MESSAGE_DECODERS[number]
@@ -687,8 +1028,11 @@ def _decoder_for_type(number):
 
 
 class SentenceFragment:
+    __slots__ = ('talker', 'sentence_type', 'total_fragments', 'fragment_number', 'message_id', 'radio_channel',
+                 'payload', 'checksum', 'time', 'text', 'valid')
+
     def __init__(self, talker, sentence_type, total_fragments, fragment_number, message_id, radio_channel, payload,
-                 checksum, received_time=None, text=None):
+                 checksum, received_time=None, text=None, valid=None):
         self.talker = talker
         self.sentence_type = sentence_type
         self.total_fragments = total_fragments
@@ -699,6 +1043,9 @@ class SentenceFragment:
         self.checksum = checksum
         self.time = received_time
         self.text = text
+        if valid is None and text is not None:
+            valid = nmea_checksum(text) == int(checksum, 16)
+        self.valid = valid
 
     def initial(self):
         return self.fragment_number == 1
@@ -717,7 +1064,7 @@ class SentenceFragment:
         return self.payload.bits
 
     def check(self):
-        return int(self.checksum, 16) == nmea_checksum(self.text)
+        return self.valid
 
 
 class Field(object):
@@ -745,26 +1092,62 @@ class Field(object):
 
 
 class Sentence:
-    def __init__(self, talker, sentence_type, radio_channel, payload, checksums, received_time=None, text=None):
+    """
+    A complete AIS message, from one or more fragments. The text and checksums
+    of each fragment are available as lists, but for the usual single fragment
+    they are held as plain strings. Checksums are checked once, when parsed,
+    and valid says whether they all were. Field values are decoded when first
+    asked for and kept, so looking one up again is just a dict hit.
+    """
+    __slots__ = ('talker', 'sentence_type', 'radio_channel', 'payload', '_checksums', 'time', '_text', 'type_num',
+                 '_decoder', '_values', '_validity', 'valid')
+
+    def __init__(self, talker, sentence_type, radio_channel, payload, checksums, received_time=None, text=None,
+                 validity=None):
         self.talker = talker
         self.sentence_type = sentence_type
         self.radio_channel = radio_channel
         self.payload = payload
-        self.checksums = checksums
+        self._checksums = _unwrapped(checksums)
         self.time = received_time
-        self.text = text
-        self.type_num = _int_lookup[payload.data[0].ascii[0]]
+        self._text = _unwrapped(text)
+        self.type_num = _int_lookup[payload._first_character()]
         self._decoder = _decoder_for_type(self.type_num)
+        self._values = None
+        if validity is None and text is not None:
+            validity = [nmea_checksum(t) == int(c, 16) for t, c in zip(self.text, self.checksums)]
+        if isinstance(validity, list) and len(validity) == 1:
+            validity = validity[0]
+        self._validity = validity
+        self.valid = all(validity) if isinstance(validity, list) else validity
+
+    @property
+    def text(self):
+        return [self._text] if isinstance(self._text, str) else self._text
+
+    @property
+    def checksums(self):
+        return [self._checksums] if isinstance(self._checksums, str) else self._checksums
 
     def type_id(self):
         return self.type_num
 
+    @property
+    def mmsi_int(self):
+        """
+        The sender's MMSI as an int, for callers that don't need the text of
+        sentence['mmsi'], or None if it isn't readable.
+        """
+        try:
+            return self.payload.int_for_bit_range(8, 38)
+        except ValueError:
+            return None
+
     def check(self):
-        checks = self.fragment_checksum_validity()
-        return reduce(lambda a, b: a and b, checks)
+        return self.valid
 
     def fragment_checksum_validity(self):
-        return [nmea_checksum(t) == int(c, 16) for t, c in (zip(self.text, self.checksums))]
+        return self._validity if isinstance(self._validity, list) else [self._validity]
 
     def location(self):
         lon = self['lon']
@@ -776,7 +1159,16 @@ class Sentence:
         return self.payload.bits
 
     def __getitem__(self, item):
-        return self._decoder.decode(item, self)
+        values = self._values
+        if values is None:
+            values = self._values = {}
+        else:
+            try:
+                return values[item]
+            except KeyError:
+                pass
+        value = values[item] = self._decoder.decode(item, self)
+        return value
 
     def __contains__(self, item):
         return item in self._decoder and self.__getitem__(item) is not None
@@ -787,6 +1179,14 @@ class Sentence:
     def fields(self):
         return [Field(fd, self) for fd in self._decoder.fields()]
 
+    def field_values(self):
+        result = self._decoder.decode_all(self)
+        if self._values is None:
+            self._values = dict(result)
+        else:
+            self._values.update(result)
+        return result
+
     @classmethod
     def from_fragments(cls, matching_fragments):
         first = matching_fragments[0]
@@ -794,11 +1194,21 @@ class Sentence:
         checksums = [f.checksum for f in matching_fragments]
         return Sentence(first.talker, first.sentence_type, first.radio_channel,
                         NmeaPayload.join([f.payload for f in matching_fragments]),
-                        checksums, first.time, text)
+                        checksums, first.time, text, [f.valid for f in matching_fragments])
 
     def __repr__(self):
         return "Sentence({}, {})".format(self.time, self.text)
 
+    def __getstate__(self):
+        # decoders are shared and full of closures, so find ours again when unpickled; values can be decoded again
+        return {name: getattr(self, name) for name in self.__slots__ if name not in ('_decoder', '_values')}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._decoder = _decoder_for_type(self.type_num)
+        self._values = None
+
     def __str__(self):
         return "Sentence(type {}, from {}, at {})".format(self.type_num, self['mmsi'], self.time)
 
@@ -816,8 +1226,7 @@ class Sentence:
         result = collections.OrderedDict()
         if self.time:
             result['received_at'] = self.time
-        for field in self.fields():
-            result[field.name()] = field.value()
+        result.update(self.field_values())
         result['text'] = self.text
         return result
 
@@ -837,6 +1246,35 @@ class SentenceIterator:
         field = self.fields.__next__()
         return field.name(), field.value()
 
+
+class RawSentence:
+    """
+    A complete message as received, with just its text, time, and armored
+    payload. StreamParser(raw=True) yields these for callers that only pass
+    messages along, as it skips building payloads and finding decoders.
+    """
+    __slots__ = ('text', 'time', 'payload_text')
+
+    def __init__(self, text, received_time, payload_text):
+        self.text = text
+        self.time = received_time
+        self.payload_text = payload_text
+
+    @property
+    def mmsi_int(self):
+        """ The sender's MMSI as an int, or None if the payload is too short or garbled to have one. """
+        header = type_and_mmsi(self.payload_text)
+        return header[1] if header else None
+
+    @classmethod
+    def from_fragments(cls, matching_fragments):
+        return RawSentence([f.text for f in matching_fragments], matching_fragments[0].time,
+                           ''.join(lump.ascii for f in matching_fragments for lump in f.payload.data))
+
+    def __repr__(self):
+        return "RawSentence({}, {})".format(self.time, self.text)
+
+
 class FragmentPool:
     """
     A smart holder for SentenceFragments that can tell when a valid message has been found.
@@ -844,9 +1282,11 @@ class FragmentPool:
     in discarding odd socks.
     """
 
-    def __init__(self):
+    def __init__(self, sentence_class=None):
         self.fragments = []
         self.full_sentence = None
+        self.updated = None
+        self.sentence_class = sentence_class or Sentence
 
     def has_full_sentence(self):
         return self.full_sentence is not None
@@ -864,14 +1304,24 @@ class FragmentPool:
         return actual == expected
 
     def add(self, fragment):
+        """
+        Adds a fragment, returning how many earlier fragments were discarded
+        because it didn't follow them. A repeat of the latest fragment, as
+        merged feeds deliver, is ignored.
+        """
+        discarded = 0
+        if len(self.fragments) > 0 and fragment.text is not None and fragment.text == self.fragments[-1].text:
+            return discarded
         if len(self.fragments) > 0 and not fragment.follows(self.fragments[-1]):
+            discarded = len(self.fragments)
             self.fragments.clear()
 
         self.fragments.append(fragment)
 
         if fragment.last() and self._has_complete_fragment_set():
-            self.full_sentence = Sentence.from_fragments(self.fragments)
+            self.full_sentence = self.sentence_class.from_fragments(self.fragments)
             self.fragments.clear()
+        return discarded
 
 
 def lines_from_source(source):
@@ -882,6 +1332,10 @@ def lines_from_source(source):
         yield from _handle_serial_source(source)
     elif re.match("https?://.*", source):
         yield from _handle_url_source(source)
+    elif source.startswith('udp://'):
+        yield from _handle_udp_source(source)
+    elif source.startswith(('tcp://', 'tcp-listen://')):
+        yield from _handle_tcp_source(source)
     else:
         # assume it's a file
         yield from _handle_file_source(source)
@@ -900,8 +1354,9 @@ def fragments_from_source(source, log_errors=False):
             logging.getLogger().error("unexpected failure for line {} in source {}".format(line, source), exc_info=True)
 
 
-def sentences_from_source(source, log_errors=False):
-    parser = StreamParser(log_errors=log_errors)
+def sentences_from_source(source, log_errors=False, payload_filter=None, duplicate_filter=None, raw=False):
+    parser = StreamParser(log_errors=log_errors, payload_filter=payload_filter, duplicate_filter=duplicate_filter,
+                          raw=raw)
     for fragment in lines_from_source(source):
         # noinspection PyBroadException
         try:
@@ -947,6 +1402,152 @@ def _handle_url_source(source):
             time.sleep(1)
 
 
+def _host_and_port(source):
+    parts = urllib.parse.urlsplit(source)
+    if not parts.port:
+        raise ValueError("need a port in {}".format(source))
+    return parts.hostname or '', parts.port
+
+
+UDP_RECEIVE_BUFFER_SIZE = 8 * 1024 * 1024
+UDP_BATCH_SIZE = 1024 * 1024
+_MAX_DATAGRAM_SIZE = 65536
+
+
+def _handle_udp_source(source):
+    """
+    Receives datagrams on the given address, e.g. udp://0.0.0.0:10110. After each
+    blocking read, whatever else has already arrived is read into the same
+    buffer without waiting, and the whole batch is decoded and split at once.
+    """
+    import socket
+
+    dont_wait = getattr(socket, 'MSG_DONTWAIT', None)
+    buffer = bytearray(UDP_BATCH_SIZE + 1)
+    view = memoryview(buffer)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECEIVE_BUFFER_SIZE)
+        s.bind(_host_and_port(source))
+        while True:
+            end = 0
+            size = s.recv_into(view[:UDP_BATCH_SIZE])
+            while True:
+                end += size
+                if buffer[end - 1:end] != b'\n':
+                    buffer[end] = 10  # a newline, to keep datagrams without line endings apart
+                    end += 1
+                if dont_wait is None or UDP_BATCH_SIZE - end < _MAX_DATAGRAM_SIZE:
+                    break
+                try:
+                    size = s.recv_into(view[end:UDP_BATCH_SIZE], 0, dont_wait)
+                except BlockingIOError:
+                    break
+            yield from str(view[:end], 'ascii', 'replace').splitlines(keepends=True)
+
+
+TCP_READ_SIZE = 256 * 1024
+TCP_QUEUED_READS = 64
+
+
+def _line_batches(connection, buffer):
+    """
+    Yields lists of lines read from a socket until it closes. Each read goes
+    into the buffer after any partial line left over from the last one, and
+    only the complete lines are decoded.
+    """
+    view = memoryview(buffer)
+    end = 0
+    while True:
+        size = connection.recv_into(view[end:])
+        if not size:
+            if end:
+                yield [str(view[:end], 'ascii', 'replace')]
+            return
+        end += size
+        last = buffer.rfind(b'\n', 0, end) + 1
+        if not last:
+            if end < len(buffer):
+                continue
+            last = end  # a line longer than the buffer can only be junk; pass it on to be skipped
+        yield str(view[:last], 'ascii', 'replace').splitlines(keepends=True)
+        buffer[:end - last] = bytes(view[last:end])
+        end -= last
+
+
+def _tcp_listener(source):
+    address = urllib.parse.urlsplit(source).netloc
+    host, port = address.rpartition(':')[::2] if ':' in address else ('', address)
+    if not port.isdigit():
+        raise ValueError("need a port in {}".format(source))
+    import socket
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, int(port)))
+    listener.listen()
+    return listener
+
+
+def _read_tcp_source(source, listener, batches, stop, current):
+    import socket
+
+    buffer = bytearray(TCP_READ_SIZE)
+    while not stop.is_set():
+        # noinspection PyBroadException
+        try:
+            if listener:
+                connection = listener.accept()[0]  # one sender at a time, so their fragments can't interleave
+            else:
+                connection = socket.create_connection(_host_and_port(source), timeout=10)
+                connection.settimeout(None)
+            with connection:
+                current[0] = connection
+                for batch in _line_batches(connection, buffer):
+                    while not stop.is_set():
+                        try:
+                            batches.put(batch, timeout=1)  # blocks when the consumer is behind
+                            break
+                        except queue.Full:
+                            pass
+        except Exception:
+            if stop.is_set():
+                return
+            logging.getLogger().error("unexpected failure in source {}".format(source), exc_info=True)
+        if not listener and not stop.is_set():
+            time.sleep(1)
+
+
+def _handle_tcp_source(source):
+    """
+    Reads lines from tcp://host:port, reconnecting as needed, or accepts
+    connections on tcp-listen://[host:]port and reads them one at a time. A
+    thread reads the socket into a bounded queue, so a slow consumer slows the
+    sender rather than using ever more memory.
+    """
+    import socket
+    import threading
+
+    listener = _tcp_listener(source) if source.startswith('tcp-listen://') else None
+    if not listener:
+        _host_and_port(source)
+    batches = queue.Queue(TCP_QUEUED_READS)
+    stop = threading.Event()
+    current = [None]
+    reader = threading.Thread(target=_read_tcp_source, args=(source, listener, batches, stop, current), daemon=True)
+    reader.start()
+    try:
+        while True:
+            yield from batches.get()
+    finally:
+        stop.set()
+        for s in (listener, current[0]):
+            if s:
+                try:
+                    s.shutdown(socket.SHUT_RDWR)  # closing alone won't wake a thread blocked on the socket
+                except OSError:
+                    pass
+                s.close()
+
+
 def _handle_file_source(source):
     if source.endswith('.gz'):
         source_reader = gzip.open(source, mode='rt')
@@ -955,3 +1556,174 @@ def _handle_file_source(source):
     with source_reader as f:
         for line in f:
             yield line
+
+
+DEFAULT_SHARD_SIZE = 64 * 1024 * 1024
+
+
+def source_shards(sources, shard_size=DEFAULT_SHARD_SIZE):
+    """
+    Splits sources into (source, start, end) shards for parallel processing.
+    Large uncompressed files are split into byte ranges, and block-gzip files
+    into runs of whole blocks; anything else, including other gzipped files,
+    is a single shard with a start and end of None.
+    """
+    from simpleais.archive import block_offsets
+
+    result = []
+    for source in sources:
+        if isinstance(source, str) and source.endswith('.gz') and os.path.isfile(source):
+            offsets = block_offsets(source)
+            if offsets and len(offsets) > 2:
+                start = offsets[0]
+                for offset in offsets[1:]:
+                    # compressed AIS is about a quarter the size, so aim for similar amounts of text per shard
+                    if offset - start >= shard_size // 4 or offset == offsets[-1]:
+                        result.append((source, start, offset))
+                        start = offset
+                continue
+        elif isinstance(source, str) and os.path.isfile(source):
+            size = os.path.getsize(source)
+            if size > shard_size:
+                for start in range(0, size, shard_size):
+                    result.append((source, start, min(start + shard_size, size)))
+                continue
+        result.append((source, None, None))
+    return result
+
+
+def _lines_from_byte_range(source, start, end):
+    """
+    Yields each line that starts in [start, end), then the lines after it, each
+    with a flag saying whether it's past the end.
+    """
+    with open(source, 'rb') as f:
+        if start > 0:
+            f.seek(start - 1)
+            f.readline()  # the line in progress belongs to the previous shard
+        while True:
+            position = f.tell()
+            raw_line = f.readline()
+            if not raw_line:
+                break
+            yield raw_line.decode('utf-8', errors='replace'), position >= end
+
+
+def _is_continuation(line):
+    parts = _sentence_parts(line)
+    return parts is not None and parts[3][1] != '1' and parts[3][2] != '1'
+
+
+def _fragment_key(fields):
+    """ The key SentenceFragment.key() gives the fragment with these fields. """
+    return fields[0][0:2], fields[0][2:], int(fields[1]), fields[3], fields[4]
+
+
+def sentences_from_shard(shard, log_errors=False, payload_filter=None):
+    """
+    Yields sentences for one shard from source_shards. A multi-fragment message
+    belongs to the shard where its first fragment starts, so a shard skips
+    fragments of messages that started before it, and reads past its end only
+    to finish the messages it started, skipping ones that start there.
+    """
+    source, start, end = shard
+    if start is None:
+        yield from sentences_from_source(source, log_errors, payload_filter)
+        return
+    parser = StreamParser(log_errors=log_errors, payload_filter=payload_filter)
+    if source.endswith('.gz'):
+        from simpleais.archive import lines_from_block_range
+
+        lines = ((line, False) for line in lines_from_block_range(source, start, end))
+    else:
+        lines = _lines_from_byte_range(source, start, end)
+    groups_started_past_end = 0
+    for line, past_end in lines:
+        if past_end and not parser.has_partial_sentence():
+            break
+        # noinspection PyBroadException
+        try:
+            parts = _sentence_parts(line)
+            continuation = parts is not None and parts[3][1] != '1' and parts[3][2] != '1'
+            if continuation and _fragment_key(parts[3]) not in parser.fragment_pool:
+                continue  # its first fragment was in an earlier shard, or was dropped
+            if past_end and not continuation:
+                # the next shard's, but read serially it would replace or crowd out what's unfinished here
+                if parts is not None and parts[3][1] != '1':
+                    parser.fragment_pool.pop(_fragment_key(parts[3]), None)
+                    groups_started_past_end += 1
+                    if groups_started_past_end >= parser.max_fragment_groups:
+                        break
+                if parts is not None and parts[0]:
+                    parser._expire_fragments(float(parts[0]))
+                continue
+            parser._add_parts(parts, line)
+            if parser.has_sentence():
+                yield parser.next_sentence()
+        except Exception:
+            logging.getLogger().error("unexpected failure for fragment {} in source {}".format(line, source),
+                                      exc_info=True)
+
+
+def _sentence_list_for_shard(shard, log_errors=False):
+    return list(sentences_from_shard(shard, log_errors))
+
+
+def parallel_map_sources(function, sources, jobs=None, shard_size=DEFAULT_SHARD_SIZE):
+    """
+    Calls function on each shard of the sources in a pool of jobs processes,
+    yielding the results in source order. The function must be picklable, so
+    a module-level function or a functools.partial of one.
+    """
+    import multiprocessing
+
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap(function, source_shards(sources, shard_size))
+
+
+def parallel_sentences_from_sources(sources, jobs=None, log_errors=False, shard_size=DEFAULT_SHARD_SIZE):
+    """
+    Like reading each source in turn with sentences_from_source, but decoded in
+    parallel. Every sentence is sent back from the worker processes, so for
+    summaries it's faster to use parallel_map_sources and merge partial results.
+    """
+    import functools
+
+    function = functools.partial(_sentence_list_for_shard, log_errors=log_errors)
+    for sentences in parallel_map_sources(function, sources, jobs, shard_size):
+        yield from sentences
+
+
+def _parts_from_buffer(buffer):
+    """
+    Yields sentence parts, as from _sentence_parts, for the first NMEA sentence
+    on each line of a bytes-like buffer. Only the matched text is decoded.
+    """
+    for m in aivdm_bytes_pattern.finditer(buffer):
+        time_text, message = m.groups()
+        message = message.decode('ascii')
+        yield time_text and time_text.decode('ascii'), message, message[-2:], message[1:-3].split(',')
+
+
+def sentences_from_mmap(source, log_errors=False, payload_filter=None):
+    """
+    Yields sentences from an uncompressed file by memory-mapping it and scanning
+    the bytes directly, which avoids decoding and copying every line. Lines
+    without a sentence are skipped silently, even when logging errors.
+    """
+    import mmap
+
+    parser = StreamParser(log_errors=log_errors, payload_filter=payload_filter)
+    with open(source, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for parts in _parts_from_buffer(buffer):
+                # noinspection PyBroadException
+                try:
+                    parser._add_parts(parts, parts[1])
+                    if parser.has_sentence():
+                        yield parser.next_sentence()
+                except Exception:
+                    logging.getLogger().error("unexpected failure for fragment {} in source {}".format(parts[1], source),
+                                              exc_info=True)
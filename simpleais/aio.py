@@ -0,0 +1,175 @@
+"""
+Asyncio sources, so that many live feeds can be read concurrently from one
+process:
+
+    async for sentence in simpleais.aio.sentences(['tcp://host:port', 'udp://0.0.0.0:10110',
+                                                    'http://example.com/feed']):
+        ...
+
+Each source gets its own StreamParser, so fragments from different feeds never
+mix. A feed that fails or closes is retried with exponential backoff without
+holding up the others.
+"""
+import asyncio
+import logging
+import urllib.parse
+
+from simpleais import StreamParser, _host_and_port
+
+INITIAL_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+UDP_BACKLOG = 10000
+
+
+async def _tcp_lines(source):
+    reader, writer = await asyncio.open_connection(*_host_and_port(source))
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            yield line.decode('ascii', errors='replace')
+    finally:
+        writer.close()
+
+
+class _DatagramReceiver(asyncio.DatagramProtocol):
+    def __init__(self, queue):
+        self.queue = queue
+
+    def datagram_received(self, data, addr):
+        for line in data.decode('ascii', errors='replace').splitlines():
+            if not self.queue.full():  # like the network, drop datagrams rather than fall ever further behind
+                self.queue.put_nowait(line)
+
+
+async def _udp_lines(source):
+    queue = asyncio.Queue(UDP_BACKLOG)
+    transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: _DatagramReceiver(queue), local_addr=_host_and_port(source))
+    try:
+        while True:
+            yield await queue.get()
+    finally:
+        transport.close()
+
+
+async def _http_chunks(reader):
+    while True:
+        size = int((await reader.readline()).split(b';')[0], 16)
+        if size == 0:
+            return
+        yield await reader.readexactly(size)
+        await reader.readline()
+
+
+async def _http_lines(source):
+    parts = urllib.parse.urlsplit(source)
+    secure = parts.scheme == 'https'
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or (443 if secure else 80),
+                                                   ssl=True if secure else None)
+    try:
+        path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        writer.write("GET {} HTTP/1.1\r\nHost: {}\r\nConnection: close\r\n\r\n".format(path, parts.netloc)
+                     .encode('ascii'))
+        await writer.drain()
+        status = (await reader.readline()).split()
+        if len(status) < 2 or status[1] != b'200':
+            raise IOError("unexpected response {} from {}".format(b' '.join(status), source))
+        headers = {}
+        while True:
+            header = await reader.readline()
+            if header in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = header.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip().lower()
+
+        if headers.get('transfer-encoding') == 'chunked':
+            remainder = b''
+            async for chunk in _http_chunks(reader):
+                *complete, remainder = (remainder + chunk).split(b'\n')
+                for line in complete:
+                    yield (line + b'\n').decode('utf-8', errors='replace')
+            if remainder:
+                yield remainder.decode('utf-8', errors='replace')
+        else:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                yield line.decode('utf-8', errors='replace')
+    finally:
+        writer.close()
+
+
+_LINE_SOURCES = {
+    'tcp': _tcp_lines,
+    'udp': _udp_lines,
+    'http': _http_lines,
+    'https': _http_lines,
+}
+
+
+def _line_source(source):
+    scheme = urllib.parse.urlsplit(source).scheme
+    if scheme not in _LINE_SOURCES:
+        raise ValueError("don't know how to read {} asynchronously".format(source))
+    if scheme in ('tcp', 'udp'):
+        _host_and_port(source)
+    return _LINE_SOURCES[scheme]
+
+
+def lines_from_source(source):
+    """
+    Returns an async iterator of text lines from a single connection to a
+    tcp://host:port, udp://host:port or http(s):// source. It ends when the
+    connection closes; UDP sources bind to the given address and never end.
+    """
+    return _line_source(source)(source)
+
+
+async def _feed(source, queue, log_errors, default_to_current_time, duplicate_filter):
+    backoff = INITIAL_BACKOFF
+    while True:
+        parser = StreamParser(default_to_current_time=default_to_current_time, log_errors=log_errors,
+                              duplicate_filter=duplicate_filter)
+        # noinspection PyBroadException
+        try:
+            async for line in lines_from_source(source):
+                backoff = INITIAL_BACKOFF
+                # noinspection PyBroadException
+                try:
+                    parser.add(line)
+                except Exception:
+                    if log_errors:
+                        logging.getLogger().error("unexpected failure for line {} in source {}".format(line, source),
+                                                  exc_info=True)
+                while parser.has_sentence():
+                    await queue.put(parser.next_sentence())
+            logging.getLogger().warning("source {} closed".format(source))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.getLogger().error("unexpected failure in source {}".format(source), exc_info=True)
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, MAX_BACKOFF)
+
+
+async def sentences(sources, log_errors=False, default_to_current_time=False, queue_size=1000, duplicate_filter=None):
+    """
+    Yields sentences from all the given sources as they arrive. Sources are
+    reconnected after failures until the caller stops iterating. With a
+    DuplicateFilter, a transmission heard by several sources is yielded once.
+    """
+    for source in sources:
+        _line_source(source)  # complain about bad sources before connecting to any
+    queue = asyncio.Queue(queue_size)
+    tasks = [asyncio.ensure_future(_feed(source, queue, log_errors, default_to_current_time, duplicate_filter))
+             for source in sources]
+    try:
+        while True:
+            yield await queue.get()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,344 @@
+"""
+Indexed AIS archives. A file is divided into blocks that each start on a
+message boundary, so that any block can be read on its own. An index sidecar
+records where each block is, its time range, and which MMSIs sent in it, so a
+search for particular senders or times only reads blocks that might match:
+
+    $ aisindex day.ais.gz
+    $ aisgrep --mmsi 367678850 --after '2016-01-11 12:00' day.ais.gz
+
+A gzipped file can only be read from the start, so indexing one recompresses
+it as a block-gzip file: a series of gzip members, one per block, then a table
+of where they start. That's still a normal gzip file, but each block can also
+be decompressed alone, and aiscat and aisburst can write it directly. Blocks
+of one file can then be read in parallel, as with `aisinfo --jobs`.
+"""
+import gzip
+import io
+import logging
+import math
+import os
+import struct
+
+from simpleais import StreamParser, _sentence_parts, _is_continuation, type_and_mmsi
+
+BLOCK_SIZE = 1024 * 1024
+INDEX_SUFFIX = '.aisidx'
+
+_INDEX_MAGIC = b'AISIDX1\n'
+_INDEX_HEADER = struct.Struct('<8sQQ')  # magic, size of the indexed file, block count
+_BLOCK_HEADER = struct.Struct('<QQddI')  # offset, length, first time, last time, MMSI count
+
+
+class IndexBlock:
+    """
+    Where a block of an archive is, and what's in it. Blocks with any untimed
+    sentences cover all times.
+    """
+    __slots__ = ('offset', 'length', 'start_time', 'end_time', 'mmsis')
+
+    def __init__(self, offset, length, start_time=-math.inf, end_time=math.inf, mmsis=frozenset()):
+        self.offset = offset
+        self.length = length
+        self.start_time = start_time
+        self.end_time = end_time
+        self.mmsis = mmsis
+
+    def might_match(self, mmsis=None, before=None, after=None):
+        if mmsis and self.mmsis.isdisjoint(mmsis):
+            return False
+        if before is not None and self.start_time > before:
+            return False
+        if after is not None and self.end_time < after:
+            return False
+        return True
+
+    def __repr__(self):
+        return "IndexBlock({}, {}, {}, {}, {} mmsis)".format(self.offset, self.length, self.start_time,
+                                                             self.end_time, len(self.mmsis))
+
+
+def _is_continuation_line(raw_line):
+    return _is_continuation(raw_line.decode('utf-8', errors='replace'))
+
+
+def line_blocks(raw_lines, block_size=BLOCK_SIZE):
+    """
+    Groups lines of bytes into lists of about block_size bytes, only starting
+    a new block where a message starts.
+    """
+    block = []
+    size = 0
+    for raw_line in raw_lines:
+        if size >= block_size and not _is_continuation_line(raw_line):
+            yield block
+            block = []
+            size = 0
+        block.append(raw_line)
+        size += len(raw_line)
+    if block:
+        yield block
+
+
+def _summarize_block(offset, raw_lines):
+    start_time = math.inf
+    end_time = -math.inf
+    untimed = False
+    mmsis = set()
+    for raw_line in raw_lines:
+        parts = _sentence_parts(raw_line.decode('utf-8', errors='replace'))
+        if parts is None:
+            continue
+        time_text, _, _, fields = parts
+        try:
+            sentence_time = float(time_text)
+            start_time = min(start_time, sentence_time)
+            end_time = max(end_time, sentence_time)
+        except (TypeError, ValueError):
+            untimed = True
+        if fields[2] == '1':
+            header = type_and_mmsi(fields[5])
+            if header:  # garbled headers have no readable MMSI, so decoding wouldn't find one either
+                mmsis.add(header[1])
+    if untimed or start_time > end_time:
+        start_time, end_time = -math.inf, math.inf
+    return IndexBlock(offset, sum(len(l) for l in raw_lines), start_time, end_time, frozenset(mmsis))
+
+
+def compress_block(data):
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+# the block table goes in the extra field of a final, empty gzip member, which gunzip skips over
+_EMPTY_MEMBER_END = b'\x03\x00' + bytes(8)  # an empty deflate block, then a CRC and size of zero
+_MAX_TABLE_BLOCKS = (0xffff - 4) // 8 - 2
+
+
+def _table_member(offsets, end):
+    table = struct.pack('<{}Q'.format(len(offsets) + 2), *offsets, end, len(offsets))
+    extra = b'AT' + struct.pack('<H', len(table)) + table
+    return b'\x1f\x8b\x08\x04' + bytes(4) + b'\x00\xff' + struct.pack('<H', len(extra)) + extra + _EMPTY_MEMBER_END
+
+
+def block_offsets(source):
+    """
+    Returns the offset of each block in a block-gzip file, followed by the end
+    of the last block, or None if the file doesn't end with a block table.
+    """
+    with open(source, 'rb') as f:
+        size = f.seek(0, io.SEEK_END)
+        if size < 16 + 16 + len(_EMPTY_MEMBER_END):
+            return None
+        f.seek(size - 16 - len(_EMPTY_MEMBER_END))
+        end, count = struct.unpack('<QQ', f.read(16))
+        if f.read() != _EMPTY_MEMBER_END or count > _MAX_TABLE_BLOCKS:
+            return None
+        f.seek(end)
+        member = f.read()
+    offsets = list(struct.unpack('<{}Q'.format(count), member[16:16 + 8 * count])) if len(member) > 16 else []
+    if len(offsets) != count or member != _table_member(offsets, end):
+        return None
+    return offsets + [end]
+
+
+class BlockGzipWriter:
+    """
+    Writes a block-gzip file: a gzip member for every block of about
+    block_size bytes, each starting on a message boundary, followed by a
+    table of where the blocks are. It's an ordinary gzip file to anything
+    else, but simpleais can read its blocks separately and in parallel.
+
+    Text can be written or printed to it like a text file; write_block() adds
+    a block of bytes directly. The file is only usable once closed.
+    """
+
+    def __init__(self, f, block_size=BLOCK_SIZE, offsets=(), position=0, owns_file=False):
+        self.file = f
+        self.block_size = block_size
+        self.offsets = list(offsets)
+        self.position = position
+        self._owns_file = owns_file
+        self._pending = []
+        self._pending_size = 0
+        self._at_line_start = True
+
+    @classmethod
+    def open(cls, path, block_size=BLOCK_SIZE):
+        """
+        Opens a file for appending, carrying on the block table of an existing
+        block-gzip file. An existing plain gzip file becomes the first block.
+        """
+        offsets = []
+        if os.path.isfile(path) and os.path.getsize(path) > 0:
+            offsets = block_offsets(path) or [0]
+        f = open(path, 'r+b' if offsets else 'ab')
+        if len(offsets) > 1:
+            f.truncate(offsets.pop())  # the old table goes; a new one is written on close
+        f.seek(0, io.SEEK_END)
+        return cls(f, block_size, offsets, f.tell(), owns_file=True)
+
+    def write(self, text):
+        if self._at_line_start and self._pending_size >= self.block_size and not _is_continuation(text):
+            self._write_pending()
+        self._pending.append(text)
+        self._pending_size += len(text)
+        self._at_line_start = text.endswith('\n')
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def _write_pending(self):
+        if self._pending:
+            self.write_block(''.join(self._pending).encode('utf-8'))
+            self._pending = []
+            self._pending_size = 0
+
+    def write_block(self, data):
+        """
+        Writes bytes as one block; they should start and end on message boundaries.
+        """
+        member = compress_block(data)
+        self.file.write(member)
+        self.offsets.append(self.position)
+        self.position += len(member)
+
+    def close(self):
+        self._write_pending()
+        if len(self.offsets) <= _MAX_TABLE_BLOCKS:
+            self.file.write(_table_member(self.offsets, self.position))
+        else:
+            logging.getLogger().warning("too many blocks for a block table; file can only be read from the start")
+        if self._owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def lines_from_block_range(source, start, end):
+    """
+    Yields the text lines of the blocks between two block offsets of a
+    block-gzip file.
+    """
+    with open(source, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    with gzip.GzipFile(fileobj=io.BytesIO(data)) as g:
+        yield from io.TextIOWrapper(g, encoding='utf-8', errors='replace')
+
+
+def _plain_blocks(source, block_size):
+    blocks = []
+    offset = 0
+    with open(source, 'rb') as f:
+        for raw_lines in line_blocks(f, block_size):
+            block = _summarize_block(offset, raw_lines)
+            blocks.append(block)
+            offset += block.length
+    return blocks
+
+
+def _recompressed_blocks(source, block_size):
+    blocks = []
+    temporary = source + '.tmp'
+    try:
+        with gzip.open(source, 'rb') as f, BlockGzipWriter(open(temporary, 'wb'), owns_file=True) as out:
+            for raw_lines in line_blocks(f, block_size):
+                block = _summarize_block(out.position, raw_lines)
+                out.write_block(b''.join(raw_lines))
+                block.length = out.position - block.offset
+                blocks.append(block)
+        os.replace(temporary, source)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    return blocks
+
+
+def index_path(source):
+    return source + INDEX_SUFFIX
+
+
+def index_source(source, block_size=BLOCK_SIZE):
+    """
+    Writes an index next to the given file, returning its blocks. A gzipped
+    file is first recompressed in blocks, replacing the original.
+    """
+    if source.endswith('.gz'):
+        blocks = _recompressed_blocks(source, block_size)
+    else:
+        blocks = _plain_blocks(source, block_size)
+    write_index(index_path(source), os.path.getsize(source), blocks)
+    return blocks
+
+
+def write_index(path, source_size, blocks):
+    with open(path, 'wb') as f:
+        f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, source_size, len(blocks)))
+        for block in blocks:
+            mmsis = sorted(block.mmsis)
+            f.write(_BLOCK_HEADER.pack(block.offset, block.length, block.start_time, block.end_time, len(mmsis)))
+            f.write(struct.pack('<{}I'.format(len(mmsis)), *mmsis))
+
+
+def read_index(source):
+    """
+    Returns the blocks from the source's index, or None if it has no index or
+    has changed size since it was indexed.
+    """
+    if not isinstance(source, str) or not os.path.isfile(index_path(source)) or not os.path.isfile(source):
+        return None
+    with open(index_path(source), 'rb') as f:
+        magic, source_size, count = _INDEX_HEADER.unpack(f.read(_INDEX_HEADER.size))
+        if magic != _INDEX_MAGIC:
+            raise ValueError("{} is not an AIS index".format(index_path(source)))
+        if source_size != os.path.getsize(source):
+            logging.getLogger().warning("ignoring out-of-date index for {}".format(source))
+            return None
+        blocks = []
+        for _ in range(count):
+            offset, length, start_time, end_time, mmsi_count = _BLOCK_HEADER.unpack(f.read(_BLOCK_HEADER.size))
+            mmsis = struct.unpack('<{}I'.format(mmsi_count), f.read(4 * mmsi_count))
+            blocks.append(IndexBlock(offset, length, start_time, end_time, frozenset(mmsis)))
+        return blocks
+
+
+def block_lines(f, block, compressed=False):
+    """
+    Returns the text lines of one block from an open binary file.
+    """
+    f.seek(block.offset)
+    data = f.read(block.length)
+    if compressed:
+        data = gzip.decompress(data)
+    return io.StringIO(data.decode('utf-8', errors='replace'), newline=None)
+
+
+def sentences_from_indexed_source(source, blocks, mmsis=None, before=None, after=None, log_errors=False,
+                                  payload_filter=None):
+    """
+    Yields sentences from just the blocks that might have ones from the given
+    MMSIs (as ints) and time range. Others may come along, so check them.
+    """
+    compressed = source.endswith('.gz')
+    with open(source, 'rb') as f:
+        for block in blocks:
+            if not block.might_match(mmsis, before, after):
+                continue
+            parser = StreamParser(log_errors=log_errors, payload_filter=payload_filter)
+            for line in block_lines(f, block, compressed):
+                # noinspection PyBroadException
+                try:
+                    parser.add(line)
+                    while parser.has_sentence():
+                        yield parser.next_sentence()
+                except Exception:
+                    logging.getLogger().error("unexpected failure for fragment {} in source {}".format(line, source),
+                                              exc_info=True)
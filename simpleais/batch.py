@@ -0,0 +1,159 @@
+"""
+Vectorized decoding of many single-fragment sentences at once. Rather than
+building a Sentence per line, payloads are unpacked into a NumPy bit matrix
+and each requested field is extracted as a column.
+"""
+import numpy
+
+from simpleais import _sentence_parts, _decoder_for_type, _int_lookup, BitFieldDecoder
+
+POSITION_TYPES = (1, 2, 3, 18)
+POSITION_FIELDS = ('mmsi', 'lon', 'lat', 'speed', 'course')
+
+_SCALES = {'I1': 1, 'I3': 3, 'I4': 4}
+_LIMITS = {'lon': (180.0, 181.0), 'lat': (90.0, 91.0)}
+
+
+def _payload_block(lines, message_types):
+    times = []
+    payloads = []
+    fills = []
+    for line in lines:
+        parts = _sentence_parts(line)
+        if not parts:
+            continue
+        time_text, message, checksum, fields = parts
+        if fields[1] != '1' or not fields[5]:
+            continue  # multi-fragment messages need reassembly; use sentences_from_source for those
+        payload = fields[5]
+        if payload[0] not in _int_lookup:
+            continue  # no message type, as with a Sentence
+        if message_types and _int_lookup[payload[0]] not in message_types:
+            continue
+        times.append(float(time_text) if time_text else numpy.nan)
+        payloads.append(payload)
+        fills.append(int(fields[6]))
+    return times, payloads, fills
+
+
+def _bit_matrix(payloads):
+    """
+    Returns an (n, 6 * width) uint8 matrix of payload bits, zero-padded on the
+    right, an (n, width) matrix that's True for characters that aren't armor,
+    and an array of each row's character count.
+    """
+    width = max(len(p) for p in payloads)
+    raw = ''.join(p.ljust(width, '0') for p in payloads).encode('utf-32-le')  # code points, even for U+FFFD
+    chars = numpy.frombuffer(raw, dtype=numpy.uint32).reshape(len(payloads), width)
+    bad = ~(((chars >= 48) & (chars <= 87)) | ((chars >= 96) & (chars <= 119)))
+    values = (chars - 48).astype(numpy.uint8)
+    values[values > 40] -= 8
+    bits = numpy.unpackbits((values << 2)[:, :, numpy.newaxis], axis=2)[:, :, :6]
+    return bits.reshape(len(payloads), width * 6), bad, numpy.array([len(p) for p in payloads])
+
+
+def _raw_column(bits, start, stop):
+    if stop - start > 62:
+        raise ValueError("field of {} bits is too wide to vectorize".format(stop - start))
+    weights = numpy.left_shift(numpy.int64(1), numpy.arange(stop - start - 1, -1, -1, dtype=numpy.int64))
+    return bits[:, start:stop].astype(numpy.int64) @ weights
+
+
+def _scaled(signed, scale):
+    """
+    Matches round(signed / 60 / 10 ** scale, 4). numpy.round isn't correctly
+    rounded, so round in integer ten-thousandths, leaving exact ties to Python.
+    """
+    numerator = signed * 10 ** 4
+    denominator = 60 * 10 ** scale
+    result = ((2 * numerator + denominator) // (2 * denominator)) / 10 ** 4
+    ties = numpy.flatnonzero(numerator % denominator * 2 == denominator)
+    for i in ties:
+        result[i] = round(int(signed[i]) / 60 / (10 ** scale), 4)
+    return result
+
+
+def _convert(raw, decoder):
+    """Applies the same conversions as BitFieldDecoder.convert, returning values and a validity mask."""
+    data_type = decoder.data_type
+    valid = numpy.ones(len(raw), dtype=bool)
+    if data_type in _SCALES:
+        signed = numpy.where(raw >= 1 << (decoder.length - 1), raw - (1 << decoder.length), raw)
+        values = _scaled(signed, _SCALES[data_type])
+        for name, (limit, sentinel) in _LIMITS.items():
+            if (decoder.name == name and data_type == 'I4') or (decoder.name.endswith(name) and data_type == 'I1'):
+                valid = (values != sentinel) & (-limit <= values) & (values <= limit)
+        return values, valid
+    elif data_type == 'U1':
+        return raw / 10.0, valid
+    elif data_type == 'b':
+        return raw == 1, valid
+    elif data_type in ('u', 'x', 'e'):
+        return raw, valid
+    else:
+        raise ValueError("can't vectorize field '{}' of type '{}'".format(decoder.name, data_type))
+
+
+def _empty_column(decoders):
+    if any(d.data_type in _SCALES or d.data_type == 'U1' for d in decoders):
+        return numpy.float64
+    elif all(d.data_type == 'b' for d in decoders):
+        return bool
+    return numpy.int64
+
+
+def _decode_block(times, payloads, fills, fields):
+    bits, bad, char_counts = _bit_matrix(payloads)
+    bit_lengths = char_counts * 6 - numpy.array(fills)
+    types = _raw_column(bits, 0, 6)
+    result = {}
+    for name in fields:
+        if name == 'received_at':
+            result[name] = numpy.ma.masked_invalid(numpy.array(times, dtype=numpy.float64))
+            continue
+        decoders = {}
+        for type_id in numpy.unique(types):
+            decoder = _decoder_for_type(int(type_id))
+            if name in decoder and isinstance(decoder.field(name), BitFieldDecoder):
+                decoders[int(type_id)] = decoder.field(name)
+        values = numpy.zeros(len(payloads), dtype=_empty_column(decoders.values()))
+        mask = numpy.ones(len(payloads), dtype=bool)
+        for type_id, decoder in decoders.items():
+            rows = (types == type_id) & (bit_lengths > decoder.end)
+            if not rows.any():
+                continue
+            converted, valid = _convert(_raw_column(bits[rows], decoder.start, decoder.end + 1), decoder)
+            garbled = bad[rows, decoder.start // 6:decoder.end // 6 + 1].any(axis=1)
+            values[rows] = converted
+            mask[rows] = ~valid | garbled
+        result[name] = numpy.ma.MaskedArray(values, mask=mask)
+    result['type'] = numpy.ma.MaskedArray(types, mask=numpy.zeros(len(types), dtype=bool))
+    return result
+
+
+def decode_batch(lines, fields=POSITION_FIELDS, message_types=POSITION_TYPES, block_size=100000):
+    """
+    Decodes the given fields from many lines of AIS text, returning a dict of
+    NumPy masked arrays, one per field plus 'type', with one entry per
+    sentence of the given message types. Use 'received_at' for the line's
+    timestamp. Entries are masked where a message type lacks the field, the
+    payload is too short, the field has characters that aren't armor, or a
+    position is out of range. MMSIs and enums come
+    back as ints; text and data fields aren't supported.
+
+    Only single-fragment sentences are decoded, which covers position reports.
+    """
+    lines = iter(lines)
+    blocks = []
+    while True:
+        block = [line for _, line in zip(range(block_size), lines)]
+        if not block:
+            break
+        times, payloads, fills = _payload_block(block, message_types)
+        if payloads:
+            blocks.append(_decode_block(times, payloads, fills, fields))
+    if not blocks:
+        empty = {name: numpy.ma.MaskedArray(numpy.zeros(0)) for name in fields}
+        empty['type'] = numpy.ma.MaskedArray(numpy.zeros(0, dtype=numpy.int64))
+        return empty
+    return {name: numpy.ma.concatenate([b[name] for b in blocks]) for name in blocks[0]}
@@ -0,0 +1,192 @@
+"""
+Approximate statistics in a fixed amount of memory, for feeds with more
+distinct keys than fit in a dict. All of these can be merged, so per-file or
+per-process results combine into the same answer as one pass over everything.
+
+HyperLogLog estimates how many distinct keys were added. With the default
+precision of 14 it uses 16 KiB, and its estimates have a standard error of
+1.04 / sqrt(2 ** precision), or about 0.8%.
+
+CountMinSketch estimates how often each key was added. An estimate is never
+too low, and with probability at least 1 - exp(-depth) it's too high by no
+more than e / width of the total count. The default 2 ** 14 by 4 table takes
+512 KiB and is within 0.017% of the total 98% of the time.
+
+HeavyHitters keeps the keys with the highest counts in a CountMinSketch. A key
+counted more than the sketch's error bound above the size-th largest count
+is reliably among them.
+
+Keys are hashed from their repr(), so they hash the same in every process.
+"""
+import hashlib
+import heapq
+import math
+
+import numpy
+
+HLL_PRECISION = 14
+SKETCH_WIDTH = 2 ** 14
+SKETCH_DEPTH = 4
+HEAVY_HITTERS = 100
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(repr(key).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct keys added, using 2 ** precision bytes.
+    """
+
+    def __init__(self, precision=HLL_PRECISION):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18, not {}".format(precision))
+        self.precision = precision
+        self.registers = bytearray(2 ** precision)
+        self._rest_bits = 64 - precision
+        self._rest_mask = (1 << self._rest_bits) - 1
+
+    def add(self, key):
+        self._add_hash(_hash(key))
+
+    def _add_hash(self, value):
+        index = value >> self._rest_bits
+        rank = self._rest_bits - (value & self._rest_mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("can't merge precision {} with {}".format(other.precision, self.precision))
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        registers = numpy.frombuffer(bytes(self.registers), dtype=numpy.uint8)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / numpy.sum(numpy.exp2(-registers.astype(float)))
+        zeros = m - numpy.count_nonzero(registers)
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * math.log(m / zeros)  # linear counting does better while there are few keys
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+
+class CountMinSketch:
+    """
+    Estimates how many times each key was added, in width * depth counters.
+    """
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.table = numpy.zeros((depth, width), dtype=numpy.int64)
+
+    def _columns(self, value):
+        first = value & 0xFFFFFFFF
+        step = value >> 32 | 1
+        return [(first + row * step) % self.width for row in range(self.depth)]
+
+    def add(self, key, count=1):
+        """ Counts the key, returning its new estimated count. """
+        return self._add_hash(_hash(key), count)
+
+    def _add_hash(self, value, count=1):
+        self.total += count
+        estimate = None
+        for row, column in zip(self.table, self._columns(value)):
+            row[column] += count
+            counter = row[column]
+            if estimate is None or counter < estimate:
+                estimate = counter
+        return int(estimate)
+
+    def estimate(self, key):
+        return int(min(row[column] for row, column in zip(self.table, self._columns(_hash(key)))))
+
+    def __getitem__(self, key):
+        return self.estimate(key)
+
+    def error_bound(self):
+        """ How far over the true count an estimate may be, with probability 1 - exp(-depth). """
+        return math.e / self.width * self.total
+
+    def merge(self, other):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("can't merge a {}x{} sketch with a {}x{} one".format(
+                other.width, other.depth, self.width, self.depth))
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class HeavyHitters:
+    """
+    Keeps the size keys with the highest estimated counts, and a HyperLogLog
+    of all of them. The counts come from a CountMinSketch, so they may be high
+    by up to its error_bound().
+    """
+
+    def __init__(self, size=HEAVY_HITTERS, width=SKETCH_WIDTH, depth=SKETCH_DEPTH, precision=HLL_PRECISION):
+        if size < 1:
+            raise ValueError("size must be at least 1, not {}".format(size))
+        self.size = size
+        self.sketch = CountMinSketch(width, depth)
+        self.distinct = HyperLogLog(precision)
+        self.top = {}
+        self._heap = []  # (count, serial, key); a count lower than top[key] is stale
+        self._serial = 0
+
+    def _push(self, count, key):
+        self._serial += 1
+        heapq.heappush(self._heap, (count, self._serial, key))
+
+    def _smallest(self):
+        heap = self._heap
+        while heap[0][0] != self.top[heap[0][2]]:
+            _, _, key = heapq.heappop(heap)
+            self._push(self.top[key], key)
+        return heap[0]
+
+    def add(self, key, count=1):
+        value = _hash(key)
+        estimate = self.sketch._add_hash(value, count)
+        self.distinct._add_hash(value)
+        self._offer(key, estimate)
+
+    def _offer(self, key, estimate):
+        if key in self.top:
+            self.top[key] = estimate
+        elif len(self.top) < self.size:
+            self.top[key] = estimate
+            self._push(estimate, key)
+        else:
+            smallest, _, smallest_key = self._smallest()
+            if estimate > smallest:
+                heapq.heappop(self._heap)
+                del self.top[smallest_key]
+                self.top[key] = estimate
+                self._push(estimate, key)
+
+    def merge(self, other):
+        if other.size != self.size:
+            raise ValueError("can't merge the top {} with the top {}".format(other.size, self.size))
+        self.sketch.merge(other.sketch)
+        self.distinct.merge(other.distinct)
+        estimates = {key: self.sketch.estimate(key) for key in list(self.top) + list(other.top)}
+        self.top = {}
+        self._heap = []
+        for key in sorted(estimates, key=estimates.get, reverse=True):
+            self._offer(key, estimates[key])
+        return self
+
+    def most_common(self, n=None):
+        """ Returns (key, estimated count) pairs, highest first, like Counter.most_common(). """
+        return sorted(self.top.items(), key=lambda item: item[1], reverse=True)[:n]
+
+    def __len__(self):
+        return self.distinct.count()
@@ -1,4 +1,6 @@
+import collections
 import functools
+import heapq
 import logging
 import math
 import os
@@ -15,10 +17,21 @@ import click
 import numpy
 from dateutil.parser import parse as dateutil_parse
 
-from simpleais import sentences_from_source
+from simpleais import (sentences_from_source, sentences_from_shard, type_and_mmsi, parallel_map_sources,
+                       DEFAULT_SHARD_SIZE, DuplicateFilter, MESSAGE_DECODERS, ENUM_LOOKUPS, AisEnum, Bits,
+                       BitFieldDecoder)
+from simpleais.archive import BLOCK_SIZE, BlockGzipWriter, index_source, read_index, sentences_from_indexed_source
+from simpleais.sketch import HEAVY_HITTERS, HeavyHitters, HyperLogLog
 
 _RADIUS_OF_EARTH = 6373.0
 
+# smaller than usual, as aisburst holds a block in memory for every sender
+BURST_BLOCK_SIZE = 64 * 1024
+
+# map points are held until there are this many, then counted in a grid with this many cells a side
+MAP_CHUNK = 64 * 1024
+MAP_GRID_CELLS = 1024
+
 
 @contextmanager
 def wild_disregard_for(e):
@@ -49,25 +62,103 @@ def print_sentence_source(sentence, file=None):
             print(output, flush=True)
 
 
-def sentences_from_sources(sources, log_errors=False):
+def sentences_from_sources(sources, log_errors=False, payload_filter=None, duplicate_filter=None, merge=False,
+                           raw=False):
+    """
+    Yields sentences from each source in turn, or from stdin if there are none.
+    A duplicate_filter is shared by all the sources, so a transmission heard by
+    several receivers is only yielded once. With merge, the sources are read
+    side by side and interleaved by time instead. With raw, they are
+    RawSentences, for passing along without decoding.
+    """
     if len(sources) > 0:
-        for source in sources:
-            try:
-                for sentence in sentences_from_source(source, log_errors):
-                    yield sentence
-            except:
-                logging.exception("Unexpected failure with source {}; continuing".format(source))
+        streams = [_sentences_or_complaint(source, log_errors, payload_filter, duplicate_filter, raw)
+                   for source in sources]
+        if merge:
+            yield from merge_by_time(streams)
+        else:
+            for stream in streams:
+                yield from stream
     else:
-        for sentence in sentences_from_source(sys.stdin, log_errors):
+        for sentence in sentences_from_source(sys.stdin, log_errors, payload_filter, duplicate_filter, raw):
             yield sentence
 
 
+def _sentences_or_complaint(source, log_errors, payload_filter, duplicate_filter, raw):
+    try:
+        for sentence in sentences_from_source(source, log_errors, payload_filter, duplicate_filter, raw):
+            yield sentence
+    except:
+        logging.exception("Unexpected failure with source {}; continuing".format(source))
+
+
+def _sentence_time(sentence):
+    return sentence.time if sentence.time is not None else -math.inf
+
+
+def merge_by_time(streams):
+    """
+    Merges streams of sentences that are each in time order into one stream in
+    time order, holding just one sentence per stream. Sentences without a time
+    are passed along as soon as they are read.
+    """
+    return heapq.merge(*streams, key=_sentence_time)
+
+
+def duplicate_filter_for(dedup):
+    return DuplicateFilter() if dedup else None
+
+
+def report_duplicates(duplicate_filter):
+    if duplicate_filter:
+        print("Dropped {} duplicate sentences.".format(duplicate_filter.duplicate_count), file=sys.stderr)
+
+
+def summarize_sources(summarize, merge, start, sources, jobs=1, log_errors=False, shard_size=DEFAULT_SHARD_SIZE,
+                      duplicate_filter=None):
+    """
+    Summarizes sentences from the sources, either directly or, with more than one
+    job, by summarizing shards in worker processes and merging the results.
+    summarize(sentences, start) must be a picklable, module-level function.
+    Duplicates can only be found across the whole input, so a duplicate_filter
+    means reading in this process.
+    """
+    if jobs > 1 and len(sources) > 0 and duplicate_filter is None:
+        # shards are sent to workers while results come back, so start mustn't be merged into
+        summary = None
+        function = functools.partial(_summarize_shard, summarize, start, log_errors)
+        for partial_summary in parallel_map_sources(function, sources, jobs, shard_size):
+            summary = partial_summary if summary is None else merge(summary, partial_summary)
+        return start if summary is None else summary
+    else:
+        return summarize(sentences_from_sources(sources, log_errors, duplicate_filter=duplicate_filter), start)
+
+
+def _summarize_shard(summarize, start, log_errors, shard):
+    return summarize(sentences_from_shard(shard, log_errors), start)
+
+
+def _both(a, b):
+    return a and b
+
+
+def _either(a, b):
+    return a or b
+
+
 @click.command()
 @click.argument('sources', nargs=-1)
+@click.option('--merge', is_flag=True, help="interleave time-ordered sources by time")
+@click.option('--gzip', 'block_gzip', is_flag=True, help="write block-gzip, which can be searched and read in parallel")
 @click.option('--verbose', is_flag=True)
-def cat(sources, verbose):
+def cat(sources, merge, block_gzip, verbose):
     """ Prints out all complete AIS transmissions.  """
-    for sentence in sentences_from_sources(sources, log_errors=verbose):
+    if block_gzip:
+        with BlockGzipWriter(sys.stdout.buffer) as writer:
+            for sentence in sentences_from_sources(sources, log_errors=verbose, merge=merge, raw=True):
+                print_sentence_source(sentence, writer)
+        return
+    for sentence in sentences_from_sources(sources, log_errors=verbose, merge=merge, raw=True):
         with wild_disregard_for(BrokenPipeError):
             print_sentence_source(sentence)
 
@@ -88,26 +179,74 @@ class Taster(object):
         self.after = after
         if mode == 'and' or mode is None:
             self.default_result = [True]
-            self.reducer = lambda x, y: x and y
+            self.reducer = _both
         elif mode == 'or':
             self.default_result = [False]
-            self.reducer = lambda x, y: x or y
+            self.reducer = _either
         else:
             raise ValueError("unknown mode {}".format(mode))
         self.checksum = checksum
         self.invert_match = invert_match
 
+    def raw_filter(self):
+        """
+        Returns a function that, given the armored payload of a sentence or of
+        the first fragment of one, returns False only if likes() would reject
+        the sentence. Only the type, MMSI, and vessel class can be decided
+        this way; returns None if the criteria can't be checked cheaply.
+        """
+        decidable = [c for c in (self.mmsi, self.sentence_type, self.vessel_class) if c]
+        undecidable = [c for c in (self.lon, self.lat, self.field, self.value, self.before, self.after) if c] + \
+                      [c for c in [self.checksum] if c is not None]
+        if not decidable:
+            return None
+        if undecidable and (self.reducer is _either or self.invert_match):
+            return None
+
+        def payload_filter(payload):
+            header = type_and_mmsi(payload)
+            if header is None:
+                return True  # too short to tell, so let likes() decide
+            type_id, mmsi = header
+            factors = copy(self.default_result)
+            if self.mmsi:
+                factors.append("%09i" % mmsi in self.mmsi)
+            if self.sentence_type:
+                factors.append(type_id in self.sentence_type)
+            if self.vessel_class in ('a', 'b'):
+                factors.append(self._class_matches(type_id))
+            result = functools.reduce(self.reducer, factors)
+            if self.invert_match:
+                return not result
+            return result
+
+        return payload_filter
+
+    def index_query(self):
+        """
+        Returns the MMSIs (as ints, or None for any) and before and after times
+        that an archive index can narrow a search by, or None if an index can't
+        rule anything out.
+        """
+        if self.reducer is _either or self.invert_match or not (self.mmsi or self.before or self.after):
+            return None
+        mmsis = frozenset(int(m) for m in self.mmsi if m.isdigit()) if self.mmsi else None
+        return mmsis, self.before or None, self.after or None
+
+    def _class_matches(self, type_id):
+        if self.vessel_class == 'a':
+            return type_id in [1, 2, 3, 5]
+        elif self.vessel_class == 'b':
+            return type_id in [18, 19, 24]
+
     def likes(self, sentence):
         factors = copy(self.default_result)
         if self.mmsi:
             factors.append(sentence['mmsi'] in self.mmsi)
         if self.sentence_type:
             factors.append(sentence.type_id() in self.sentence_type)
-        if self.vessel_class:
-            if self.vessel_class == 'a':
-                factors.append(sentence.type_id() in [1, 2, 3, 5])
-            elif self.vessel_class == 'b':
-                factors.append(sentence.type_id() in [18, 19, 24])
+        if self.vessel_class in ('a', 'b'):
+            factors.append(self._class_matches(sentence.type_id()))
         if self.lon or self.lat:
             loc = sentence.location()
             if self.lon:
@@ -125,7 +264,7 @@ class Taster(object):
         if self.after:
             factors.append(self.after <= sentence.time)
         if self.checksum is not None:
-            factors.append(sentence.check() == self.checksum)
+            factors.append(sentence.valid == self.checksum)
         result = functools.reduce(self.reducer, factors)
         if self.invert_match:
             return not result
@@ -156,10 +295,11 @@ def parse_date(string):
 @click.option('--mode', type=click.Choice(['and', 'or']))
 @click.option('--invert-match', '-v', is_flag=True)
 @click.option('--max-count', 'max', type=int)
+@click.option('--jobs', '-j', type=int, default=1, help="worker processes to use for file sources")
 @click.option('--verbose', is_flag=True)
 def grep(sources, mmsi=None, mmsi_file=None, sentence_type=None, vessel_class=None, lon=None, lat=None,
          value=None, before=None, after=None, field=None, checksum=None,
-         mode='and', invert_match=False, max=None, verbose=False):
+         mode='and', invert_match=False, max=None, jobs=1, verbose=False):
     """ Filters AIS transmissions.  """
     print(f'mmsi={mmsi}', file=sys.stderr)
     if not mmsi:
@@ -176,12 +316,46 @@ def grep(sources, mmsi=None, mmsi_file=None, sentence_type=None, vessel_class=No
     print(taster.mmsi, file=sys.stderr)
     with wild_disregard_for(BrokenPipeError):
         matches = 0
-        for sentence in sentences_from_sources(sources, log_errors=verbose):
+        for sentence in tasty_sentences_from_sources(taster, sources, jobs, log_errors=verbose):
+            print_sentence_source(sentence)
+            matches += 1
+            if max and matches >= max:
+                break
+
+
+def tasty_sentences_from_sources(taster, sources, jobs=1, log_errors=False):
+    if jobs > 1 and len(sources) > 0:
+        function = functools.partial(_tasty_sentences_for_shard, taster, log_errors)
+        for sentences in parallel_map_sources(function, sources, jobs):
+            yield from sentences
+    else:
+        for sentence in _sentences_for_taster(taster, sources, log_errors):
             if taster.likes(sentence):
-                print_sentence_source(sentence)
-                matches += 1
-                if max and matches >= max:
-                    break
+                yield sentence
+
+
+def _sentences_for_taster(taster, sources, log_errors):
+    """
+    Like sentences_from_sources, but for sources with an archive index, only
+    reads the blocks that might have sentences the taster likes.
+    """
+    payload_filter = taster.raw_filter()
+    query = taster.index_query()
+    if query is None or not sources:
+        yield from sentences_from_sources(sources, log_errors, payload_filter)
+        return
+    for source in sources:
+        blocks = read_index(source)
+        if blocks is None:
+            yield from sentences_from_sources([source], log_errors, payload_filter)
+        else:
+            yield from sentences_from_indexed_source(source, blocks, *query, log_errors=log_errors,
+                                                     payload_filter=payload_filter)
+
+
+def _tasty_sentences_for_shard(taster, log_errors, shard):
+    return [sentence for sentence in sentences_from_shard(shard, log_errors, taster.raw_filter())
+            if taster.likes(sentence)]
 
 
 def read_mmsi_file(mmsi_file):
@@ -189,13 +363,29 @@ def read_mmsi_file(mmsi_file):
         return frozenset([l.strip() for l in f.readlines()])
 
 
+@click.command()
+@click.argument('sources', nargs=-1, required=True)
+@click.option('--block-size', type=int, default=BLOCK_SIZE, help="approximate uncompressed bytes per block")
+@click.option('--verbose', is_flag=True)
+def index(sources, block_size, verbose):
+    """
+    Indexes AIS files by time and sender so that aisgrep can skip to the parts
+    that matter. Gzipped files are recompressed in independent blocks.
+    """
+    for source in sources:
+        blocks = index_source(source, block_size)
+        if verbose:
+            print("{}: {} blocks".format(source, len(blocks)), file=sys.stderr)
+
+
 @click.command()
 @click.argument('sources', nargs=-1)
 @click.option('--verbose', is_flag=True)
 @click.option('--raw', is_flag=True)
-def as_text(sources, verbose, raw):
+@click.option('--merge', is_flag=True, help="interleave time-ordered sources by time")
+def as_text(sources, verbose, raw, merge):
     """ Simple text display, one line per AIS sentence. """
-    for sentence in sentences_from_sources(sources, log_errors=verbose):
+    for sentence in sentences_from_sources(sources, log_errors=verbose, merge=merge):
         with wild_disregard_for(BrokenPipeError):
             print(text_for(sentence, raw))
 
@@ -256,24 +446,32 @@ def dimensions_as_text(type_5_sentence):
 @click.command()
 @click.argument('source', nargs=1)
 @click.argument('dest', nargs=1, required=False)
+@click.option('--dedup', is_flag=True, help="drop repeats of a transmission heard by several receivers")
 @click.option('--verbose', is_flag=True)
-def burst(source, dest, verbose):
-    """ Takes large AIS files and splits them up by sender. """
+def burst(source, dest, dedup, verbose):
+    """
+    Takes large AIS files and splits them up by sender. If the destination ends
+    in .gz, the files are written as block-gzip.
+    """
     if not dest:
         dest = source
     writers = {}
     fname, ext = os.path.splitext(dest)
+    duplicate_filter = duplicate_filter_for(dedup)
 
-    for sentence in sentences_from_source(source, log_errors=verbose):
-        mmsi = sentence['mmsi']
-        if not mmsi:
-            mmsi = 'other'
+    for sentence in sentences_from_source(source, log_errors=verbose, duplicate_filter=duplicate_filter, raw=True):
+        mmsi = sentence.mmsi_int
         if mmsi not in writers:
-            writers[mmsi] = open("{}-{}{}".format(fname, mmsi, ext), "at")
+            path = "{}-{}{}".format(fname, 'other' if mmsi is None else '{:09d}'.format(mmsi), ext)
+            if ext == '.gz':
+                writers[mmsi] = BlockGzipWriter.open(path, BURST_BLOCK_SIZE)
+            else:
+                writers[mmsi] = open(path, "at")
         print_sentence_source(sentence, writers[mmsi])
 
     for writer in writers.values():
         writer.close()
+    report_duplicates(duplicate_filter)
 
 
 class FieldsHistory:
@@ -284,7 +482,8 @@ class FieldsHistory:
         return self.values[key]
 
     def __setitem__(self, key, value):
-        value = value.strip()
+        if value is not None:
+            value = value.strip()
         if key and value and len(value) > 0:
             if value not in (self.values[key]):
                 self.values[key].append(value)
@@ -292,6 +491,11 @@ class FieldsHistory:
     def __iter__(self):
         return self.values.__iter__()
 
+    def merge(self, other):
+        for key in other.values:
+            for value in other.values[key]:
+                self[key] = value
+
 
 class SenderInfo:
     def __init__(self):
@@ -300,6 +504,14 @@ class SenderInfo:
         self.type_counts = defaultdict(int)
         self.fields = FieldsHistory()
 
+    def merge(self, other):
+        if not self.mmsi:
+            self.mmsi = other.mmsi
+        self.sentence_count += other.sentence_count
+        for type_id, count in other.type_counts.items():
+            self.type_counts[type_id] += count
+        self.fields.merge(other.fields)
+
     def add(self, sentence):
         if not self.mmsi:
             self.mmsi = sentence['mmsi']
@@ -335,6 +547,11 @@ class MaxMin:
         if value < self.min:
             self.min = value
 
+    def merge(self, other):
+        if other.valid():
+            self.add(other.min)
+            self.add(other.max)
+
     def range(self):
         if self.valid:
             return self.max - self.min
@@ -357,6 +574,10 @@ class GeoInfo:
         self.lon.add(point[0])
         self.lat.add(point[1])
 
+    def merge(self, other):
+        self.lon.merge(other.lon)
+        self.lat.merge(other.lat)
+
     def report(self, indent="", file=sys.stdout):
         if not self.valid():
             return
@@ -400,14 +621,20 @@ def distance(p1, p2):
 
 
 class SentencesInfo:
-    def __init__(self, by_type=False):
+    """
+    Counts sentences, types, and senders. When approximate, senders are only
+    counted with a HyperLogLog, so memory doesn't grow with the number of them.
+    """
+
+    def __init__(self, by_type=False, approximate=False):
         self.by_type = by_type
+        self.approximate = approximate
         self.sentence_count = 0
         self.bad_checksum_count = 0
         self.time_range = MaxMin()
         if by_type:
             self.type_counts = defaultdict(int)
-        self.sender_counts = defaultdict(int)
+        self.sender_counts = HyperLogLog() if approximate else defaultdict(int)
 
     def add(self, sentence):
         self.sentence_count += 1
@@ -415,16 +642,33 @@ class SentencesInfo:
             self.time_range.add(sentence.time)
         if self.by_type:
             self.type_counts[sentence.type_id()] += 1
-        self.sender_counts[sentence['mmsi']] += 1
+        if self.approximate:
+            self.sender_counts.add(sentence.mmsi_int)
+        else:
+            self.sender_counts[sentence.mmsi_int] += 1
 
     def count_bad_checksum(self):
         self.bad_checksum_count += 1
 
+    def merge(self, other):
+        self.sentence_count += other.sentence_count
+        self.bad_checksum_count += other.bad_checksum_count
+        self.time_range.merge(other.time_range)
+        if self.by_type:
+            for type_id, count in other.type_counts.items():
+                self.type_counts[type_id] += count
+        if self.approximate:
+            self.sender_counts.merge(other.sender_counts)
+        else:
+            for mmsi, count in other.sender_counts.items():
+                self.sender_counts[mmsi] += count
+
     def report(self, file=sys.stdout):
         if self.sentence_count < 1:
             print("No sentences found.", file=file)
             return
-        print("Found {} senders in {} good sentences with {} invalid ({:0.2f}%).".format(
+        print("Found {}{} senders in {} good sentences with {} invalid ({:0.2f}%).".format(
+            "about " if self.approximate else "",
             len(self.sender_counts),
             self.sentence_count,
             self.bad_checksum_count,
@@ -466,38 +710,132 @@ class Bucketer:
             return self.max_buckets
         return result
 
+    def bucket_all(self, values):
+        """ Buckets an array of values at once; ones outside the range go in the nearest bucket. """
+        return numpy.clip(numpy.digitize(values, self.bins) - 1, 0, self.max_buckets)
+
     def __str__(self, *args, **kwargs):
         return "Bucketer({}, {}, {}, {})".format(self.min_val, self.max_val, self.bucket_count, self.bins)
 
 
+class DensityGrid:
+    """
+    Counts points in a square grid of equal cells, so memory doesn't grow with
+    the number of points. The grid is first fitted to the points it's given.
+    When later ones fall outside, pairs of cells are added together to cover
+    twice the span, as often as it takes. That keeps each count exact for its
+    cell, but the cells get coarser as the area grows.
+    """
+
+    def __init__(self, cells=MAP_GRID_CELLS):
+        if cells % 2:
+            raise ValueError("cells must be even, not {}".format(cells))
+        self.cells = cells
+        self.counts = None  # indexed by lon cell, then lat cell
+        self.origin = None  # lon and lat of the low corner
+        self.size = None  # lon and lat span of a cell
+
+    def valid(self):
+        return self.counts is not None
+
+    def add(self, lons, lats, weights=None):
+        if len(lons) == 0:
+            return
+        if self.counts is None:
+            self._fit(lons, lats)
+        for axis, values in ((0, lons), (1, lats)):
+            while values.min() < self.origin[axis]:
+                self._grow(axis, downward=True)
+            while values.max() >= self.origin[axis] + self.cells * self.size[axis]:
+                self._grow(axis, downward=False)
+        x = numpy.clip(((lons - self.origin[0]) / self.size[0]).astype(int), 0, self.cells - 1)
+        y = numpy.clip(((lats - self.origin[1]) / self.size[1]).astype(int), 0, self.cells - 1)
+        counts = numpy.bincount(x * self.cells + y, weights, minlength=self.cells * self.cells)
+        self.counts += counts.astype(self.counts.dtype).reshape(self.cells, self.cells)
+
+    def _fit(self, lons, lats):
+        self.counts = numpy.zeros((self.cells, self.cells), dtype=numpy.int64)
+        self.origin = [lons.min(), lats.min()]
+        # one cell short, so the largest value lands inside the last cell rather than on its far edge
+        self.size = [max(values.max() - values.min(), 1e-6) / (self.cells - 1) for values in (lons, lats)]
+
+    def _grow(self, axis, downward):
+        paired = numpy.add.reduceat(self.counts, numpy.arange(0, self.cells, 2), axis=axis)
+        empty = numpy.zeros_like(paired)
+        self.counts = numpy.concatenate((empty, paired) if downward else (paired, empty), axis=axis)
+        if downward:
+            self.origin[axis] -= self.cells * self.size[axis]
+        self.size[axis] *= 2
+
+    def cell_centers(self):
+        """ Returns the lons, lats, and counts of the cells with anything in them. """
+        x, y = numpy.nonzero(self.counts)
+        return (self.origin[0] + (x + 0.5) * self.size[0], self.origin[1] + (y + 0.5) * self.size[1],
+                self.counts[x, y])
+
+    def merge(self, other):
+        if other.valid():
+            self.add(*other.cell_centers())
+
+
 class DensityMap:
-    def __init__(self, width=60, height_scale=0.5, indent=""):
+    """
+    Draws a map of where points are. Points are held until there are
+    MAP_CHUNK of them, then counted in a DensityGrid a chunk at a time, so
+    memory stays the same however many there are. Small maps are drawn
+    straight from their points; bigger ones are drawn from the grid's cells,
+    which are much smaller than a map character.
+    """
+
+    def __init__(self, width=60, height_scale=0.5, indent="", chunk_size=MAP_CHUNK):
         self.desired_width = width
         self.height_scale = height_scale  # terminal characters are about 2x tall as they are wide
         self.indent = indent
+        self.chunk_size = chunk_size
         self.geo_info = GeoInfo()
-        self.points = []
+        self.lons = []
+        self.lats = []
+        self.grid = DensityGrid()
+        self.point_count = 0
         self.marks = []
         self.cached_height = None
 
     def add(self, point):
-        self.points.append(point)
+        self.lons.append(point[0])
+        self.lats.append(point[1])
+        self.point_count += 1
         self.geo_info.add(point)
         if self.cached_height is not None:
             self.cached_height = None
+        if len(self.lons) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        self.grid.add(numpy.array(self.lons, dtype=float), numpy.array(self.lats, dtype=float))
+        self.lons = []
+        self.lats = []
+
+    def merge(self, other):
+        for point in zip(other.lons, other.lats):
+            self.add(point)
+        if other.grid.valid():
+            self.grid.merge(other.grid)
+            self.point_count += int(other.grid.counts.sum())
+            self.geo_info.merge(other.geo_info)
+            self.cached_height = None
 
     def valid(self):
-        return len(self.points) > 0 and self.geo_info.valid()
+        return self.point_count > 0 and self.geo_info.valid()
 
     def bucket(self, points):
+        xs, ys = self._bucket_all(numpy.array([p[0] for p in points], dtype=float),
+                                  numpy.array([p[1] for p in points], dtype=float))
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def _bucket_all(self, lons, lats):
         xb = Bucketer(self.geo_info.lon.min, self.geo_info.lon.max, self.width())
         yb = Bucketer(self.geo_info.lat.min, self.geo_info.lat.max, self.height())
-        result = []
-        for point in points:
-            x = xb.bucket(point[0])
-            y = self.height() - 1 - yb.bucket(point[1])
-            result.append((x, y))
-        return result
+        return xb.bucket_all(lons), self.height() - 1 - yb.bucket_all(lats)
 
     def height(self):
         if self.cached_height is None:
@@ -512,14 +850,19 @@ class DensityMap:
         return self.desired_width
 
     def to_counts(self):
-        # noinspection PyUnusedLocal
-        results = [[0 for ignored in range(self.width())] for ignored in range(self.height())]
+        results = numpy.zeros((self.height(), self.width()), dtype=numpy.int64)
         if self.geo_info.valid():
-            for x, y in self.bucket(self.points):
-                results[y][x] += 1
+            if self.grid.valid():
+                self._flush()
+                lons, lats, weights = self.grid.cell_centers()
+            else:
+                lons, lats, weights = numpy.array(self.lons, dtype=float), numpy.array(self.lats, dtype=float), None
+            xs, ys = self._bucket_all(lons, lats)
+            counts = numpy.bincount(ys * self.width() + xs, weights, minlength=results.size)
+            results += counts.astype(numpy.int64).reshape(results.shape)
             for x, y in self.bucket(self.marks):
                 results[y][x] = -1
-        return results
+        return results.tolist()
 
     def to_text(self):
         counts = self.to_counts()
@@ -556,56 +899,87 @@ class DensityMap:
         self.geo_info.add(point)
 
 
+class InfoSummary:
+    """Everything info reports on, gathered from one run of sentences."""
+
+    def __init__(self, by_type=False, individual=False, show_map=False, approximate=False):
+        self.individual = individual
+        self.show_map = show_map
+        self.sentences_info = SentencesInfo(by_type, approximate)
+        self.sender_info = defaultdict(SenderInfo)
+        self.geo_info = GeoInfo()
+        self.map_info = DensityMap()
+
+    def add(self, sentence):
+        if not sentence.valid:
+            self.sentences_info.count_bad_checksum()
+            return
+
+        self.sentences_info.add(sentence)
+
+        loc = sentence.location()
+        if loc:
+            self.geo_info.add(loc)
+            if self.show_map:
+                self.map_info.add(loc)
+
+        if self.individual and sentence.mmsi_int is not None:  # a garbled MMSI is no sender to report on
+            self.sender_info[sentence.mmsi_int].add(sentence)
+
+    def merge(self, other):
+        self.sentences_info.merge(other.sentences_info)
+        self.geo_info.merge(other.geo_info)
+        self.map_info.merge(other.map_info)
+        for mmsi, sender in other.sender_info.items():
+            self.sender_info[mmsi].merge(sender)
+        return self
+
+
+def summarize_info(sentences, summary):
+    for sentence in sentences:
+        try:
+            summary.add(sentence)
+        except:
+            print("Unexpected failure for sentence", sentence.text, file=sys.stderr)
+            raise
+    return summary
+
+
 @click.command()
 @click.argument('sources', nargs=-1)
 @click.option('--individual', '-i', is_flag=True)
 @click.option('--map', '-m', "show_map", is_flag=True)
 @click.option('--by-type', '-t', is_flag=True)
 @click.option('--point', '-p', type=(float, float), multiple=True)
+@click.option('--jobs', '-j', type=int, default=1, help="worker processes to use for file sources")
+@click.option('--dedup', is_flag=True, help="drop repeats of a transmission heard by several receivers")
+@click.option('--approximate', '-a', is_flag=True, help="estimate the sender count in fixed memory")
 @click.option('--verbose', is_flag=True)
-def info(sources, individual, by_type, show_map, point, verbose):
+def info(sources, individual, by_type, show_map, point, jobs, dedup, approximate, verbose):
     """ Summarizes AIS transmissions. """
-    sentences_info = SentencesInfo(by_type)
-    sender_info = defaultdict(SenderInfo)
-    geo_info = GeoInfo()
+    duplicate_filter = duplicate_filter_for(dedup)
+    summary = summarize_sources(summarize_info, InfoSummary.merge,
+                                InfoSummary(by_type, individual, show_map, approximate),
+                                sources, jobs, log_errors=verbose, duplicate_filter=duplicate_filter)
+    report_duplicates(duplicate_filter)
 
-    map_info = DensityMap()
+    map_info = summary.map_info
     if point:
         for p in point:
             map_info.mark(p)
 
-    for sentence in sentences_from_sources(sources, log_errors=verbose):
-        try:
-            if not sentence.check():
-                sentences_info.count_bad_checksum()
-                continue
-
-            sentences_info.add(sentence)
-
-            loc = sentence.location()
-            if loc:
-                geo_info.add(loc)
-                if show_map:
-                    map_info.add(loc)
-
-            if individual:
-                sender_info[sentence['mmsi']].add(sentence)
-        except:
-            print("Unexpected failure for sentence", sentence.text, file=sys.stderr)
-            raise
-
     with wild_disregard_for(BrokenPipeError):
-        sentences_info.report(file=sys.stdout)
+        summary.sentences_info.report(file=sys.stdout)
 
-        if geo_info.valid():
-            geo_info.report("  ", file=sys.stdout)
+        if summary.geo_info.valid():
+            summary.geo_info.report("  ", file=sys.stdout)
 
         if show_map and map_info.valid():
             map_info.show(file=sys.stdout)
 
         if individual:
-            for mmsi in sorted(sender_info):
-                sender_info[mmsi].report(file=sys.stdout)
+            for mmsi in sorted(summary.sender_info):
+                summary.sender_info[mmsi].report(file=sys.stdout)
 
 
 def chunks(l, n):
@@ -642,10 +1016,11 @@ def dump(sources, bits, verbose):
                     pos += 48
                     print("          bits: {:3d} {}".format(pos, " ".join(group)))
 
+            values = sentence.field_values()
             for field in sentence.fields():
                 value = '-'
                 if field.valid():
-                    value = field.value()
+                    value = values[field.name()]
                     if field.name() == 'time':
                         value = time_to_text(value)
                 if bits:
@@ -682,6 +1057,32 @@ def value_tuple_for(fields, sentence):
         return result
 
 
+def count_values(fields, sentences, counts):
+    for sentence in sentences:
+        val = value_tuple_for(fields, sentence)
+        if val:
+            counts[val] += 1
+    return counts
+
+
+def merge_counts(counts, other):
+    for key, count in other.items():
+        counts[key] += count
+    return counts
+
+
+def count_values_approximately(fields, sentences, hitters):
+    for sentence in sentences:
+        val = value_tuple_for(fields, sentence)
+        if val:
+            hitters.add(val)
+    return hitters
+
+
+def merge_hitters(hitters, other):
+    return hitters.merge(other)
+
+
 def tuple_display(t):
     if len(t) == 1:
         return str(t[0])
@@ -701,15 +1102,26 @@ def tuple_display(t):
 @click.option('--hundredth', 'fields', flag_value='geo-hundredth', multiple=True)
 @click.option('--count', '-c', 'output', flag_value='count', default=True)
 @click.option('--hist', '-h', 'output', flag_value='hist')
+@click.option('--jobs', '-j', type=int, default=1, help="worker processes to use for file sources")
+@click.option('--dedup', is_flag=True, help="drop repeats of a transmission heard by several receivers")
+@click.option('--approximate', '-a', is_flag=True, help="estimate counts of the most common values in fixed memory")
+@click.option('--top', type=click.IntRange(1), default=HEAVY_HITTERS, help="how many values to keep when approximate")
 @click.option('--verbose', is_flag=True)
-def stat(sources, fields, output, verbose):
+def stat(sources, fields, output, jobs, dedup, approximate, top, verbose):
     if not fields or len(fields) < 1:
         raise click.UsageError("at least one field required; try --hour or -f type")
-    counts = defaultdict(int)
-    for sentence in sentences_from_sources(sources, log_errors=verbose):
-        val = value_tuple_for(fields, sentence)
-        if val:
-            counts[val] += 1
+    duplicate_filter = duplicate_filter_for(dedup)
+    if approximate:
+        hitters = summarize_sources(functools.partial(count_values_approximately, fields), merge_hitters,
+                                    HeavyHitters(top), sources, jobs, log_errors=verbose,
+                                    duplicate_filter=duplicate_filter)
+        counts = dict(hitters.most_common())
+        print("About {} distinct values; counts may be up to {:.0f} high.".format(
+            len(hitters), hitters.sketch.error_bound()), file=sys.stderr)
+    else:
+        counts = summarize_sources(functools.partial(count_values, fields), merge_counts, defaultdict(int),
+                                   sources, jobs, log_errors=verbose, duplicate_filter=duplicate_filter)
+    report_duplicates(duplicate_filter)
 
     key_width = max([len(str(tuple_display(k))) for k in counts.keys()], default=0)
     val_width = max([len(str(v)) for v in counts.values()], default=0)
@@ -807,11 +1219,12 @@ class RefineFilter:
 
 @click.command()
 @click.argument('sources', nargs=-1)
-def refine(sources):
+@click.option('--merge', is_flag=True, help="interleave time-ordered sources by time")
+def refine(sources, merge):
     filters = defaultdict(RefineFilter)
-    for sentence in sentences_from_sources(sources):
+    for sentence in sentences_from_sources(sources, merge=merge):
         with wild_disregard_for(BrokenPipeError):
-            filter = filters[sentence['mmsi']]
+            filter = filters[sentence.mmsi_int]
             if filter.wants(sentence):
                 print_sentence_source(sentence)
                 filter.mark(sentence)
@@ -826,6 +1239,160 @@ def to_json(sources):
             print(sentence.as_json())
 
 
+def column_kind(field_decoder):
+    if not isinstance(field_decoder, BitFieldDecoder):
+        return 'int'  # derived fields, like type 4 time
+    elif field_decoder.name == 'mmsi' or field_decoder.data_type in ('t', 's', 'd'):
+        return 'str'
+    elif field_decoder.data_type == 'e':
+        return 'int' if field_decoder.name in ENUM_LOOKUPS else 'str'
+    elif field_decoder.data_type == 'b':
+        return 'bool'
+    elif field_decoder.data_type in ('U1', 'I1', 'I3', 'I4'):
+        return 'float'
+    else:
+        return 'int'
+
+
+def column_value(value):
+    if isinstance(value, AisEnum):
+        return value.key
+    elif isinstance(value, Bits):
+        return str(value)
+    return value
+
+
+class ColumnBuffer:
+    """Accumulates the fields of one message type as columns, a row group at a time."""
+
+    def __init__(self, type_id):
+        self.type_id = type_id
+        self.kinds = collections.OrderedDict([('received_at', 'float')])
+        for field_decoder in MESSAGE_DECODERS[type_id].fields():
+            self.kinds[field_decoder.name] = column_kind(field_decoder)
+        self.columns = {name: [] for name in self.kinds}
+        self.row_count = 0
+
+    def add(self, sentence):
+        values = sentence.field_values()
+        self.columns['received_at'].append(sentence.time)
+        for name in self.kinds:
+            if name != 'received_at':
+                self.columns[name].append(column_value(values[name]))
+        self.row_count += 1
+
+    def take(self):
+        result = self.columns
+        self.columns = {name: [] for name in self.kinds}
+        self.row_count = 0
+        return result
+
+
+class NpzColumnWriter:
+    """
+    Writes row groups into one numpy .npz file, with arrays named
+    type<n>.<field>.<group>. Where a column has missing values, a boolean
+    array named type<n>.<field>.<group>.valid marks the real ones.
+    """
+    extension = '.npz'
+    _dtypes = {'int': numpy.int64, 'float': numpy.float64, 'bool': bool, 'str': str}
+    _missing = {'int': 0, 'float': numpy.nan, 'bool': False, 'str': ''}
+
+    def __init__(self, path):
+        import zipfile
+        self.zip = zipfile.ZipFile(path, mode='w', compression=zipfile.ZIP_DEFLATED)
+        self.group_counts = defaultdict(int)
+
+    def write(self, buffer):
+        group = self.group_counts[buffer.type_id]
+        self.group_counts[buffer.type_id] += 1
+        for name, values in buffer.take().items():
+            kind = buffer.kinds[name]
+            key = "type{}.{}.{}".format(buffer.type_id, name, group)
+            valid = [v is not None for v in values]
+            filled = [self._missing[kind] if v is None else v for v in values]
+            self._write_array(key, numpy.array(filled, dtype=self._dtypes[kind]))
+            if not all(valid):
+                self._write_array(key + '.valid', numpy.array(valid, dtype=bool))
+
+    def _write_array(self, key, array):
+        with self.zip.open(key + '.npy', mode='w', force_zip64=True) as f:
+            numpy.lib.format.write_array(f, array, allow_pickle=False)
+
+    def close(self):
+        self.zip.close()
+
+
+class ParquetColumnWriter:
+    """Writes one Parquet file per message type, one row group per flush."""
+    extension = '.parquet'
+
+    def __init__(self, path):
+        import pyarrow
+        import pyarrow.parquet
+        self.pyarrow = pyarrow
+        self.parquet = pyarrow.parquet
+        self.types = {'int': pyarrow.int64(), 'float': pyarrow.float64(), 'bool': pyarrow.bool_(),
+                      'str': pyarrow.string()}
+        self.fname, ext = os.path.splitext(path)
+        self.writers = {}
+
+    def write(self, buffer):
+        schema = self.pyarrow.schema([(name, self.types[kind]) for name, kind in buffer.kinds.items()])
+        if buffer.type_id not in self.writers:
+            path = "{}-type{}{}".format(self.fname, buffer.type_id, self.extension)
+            self.writers[buffer.type_id] = self.parquet.ParquetWriter(path, schema)
+        columns = buffer.take()
+        table = self.pyarrow.table({name: columns[name] for name in buffer.kinds}, schema=schema)
+        self.writers[buffer.type_id].write_table(table)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+def column_writer_for(path, output_format='auto'):
+    if output_format == 'auto':
+        output_format = 'npz' if path.endswith('.npz') else 'parquet'
+    if output_format == 'parquet':
+        try:
+            return ParquetColumnWriter(path)
+        except ImportError:
+            logging.getLogger().warning("pyarrow not installed; writing numpy .npz instead")
+            path = os.path.splitext(path)[0] + NpzColumnWriter.extension
+    return NpzColumnWriter(path)
+
+
+def write_columns(sentences, writer, row_group_size=65536):
+    buffers = {}
+    for sentence in sentences:
+        type_id = sentence.type_id()
+        if type_id not in MESSAGE_DECODERS:
+            continue
+        if type_id not in buffers:
+            buffers[type_id] = ColumnBuffer(type_id)
+        buffer = buffers[type_id]
+        buffer.add(sentence)
+        if buffer.row_count >= row_group_size:
+            writer.write(buffer)
+    for type_id in sorted(buffers):
+        if buffers[type_id].row_count > 0:
+            writer.write(buffers[type_id])
+    writer.close()
+
+
+@click.command()
+@click.argument('sources', nargs=-1)
+@click.option('--output', '-o', required=True, help="output file; .parquet (needs pyarrow) or .npz")
+@click.option('--format', 'output_format', type=click.Choice(['auto', 'parquet', 'npz']), default='auto')
+@click.option('--row-group-size', type=int, default=65536)
+@click.option('--verbose', is_flag=True)
+def to_columns(sources, output, output_format, row_group_size, verbose):
+    """ Writes AIS transmissions as columns, one table per message type. """
+    writer = column_writer_for(output, output_format)
+    write_columns(sentences_from_sources(sources, log_errors=verbose), writer, row_group_size)
+
+
 # used for profiling; call with something like "grep ../tests/sample.ais -t 20"
 if __name__ == "__main__":
     print("running", sys.argv[1], "with", sys.argv[2:], file=sys.stderr)
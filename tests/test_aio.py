@@ -0,0 +1,145 @@
+import asyncio
+import socket
+from unittest import IsolatedAsyncioTestCase, mock
+
+from simpleais import aio
+
+message_type_1 = '!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F'
+fragmented_message_type_8 = ['!AIVDM,3,1,3,A,85NoHR1KfI99t:BHBI3sWpAoS7VHRblW8McQtR3lsFR,0*5A',
+                             '!AIVDM,3,2,3,A,ApU6wWmdIeJG7p1uUhk8Tp@SVV6D=sTKh1O4fBvUcaN,0*5E',
+                             '!AIVDM,3,3,3,A,j;lM8vfK0,2*34']
+
+
+async def take(count, sources):
+    result = []
+    async with aclosing(aio.sentences(sources)) as sentences:
+        async for sentence in sentences:
+            result.append(sentence)
+            if len(result) == count:
+                break
+    return result
+
+
+class aclosing:
+    def __init__(self, generator):
+        self.generator = generator
+
+    async def __aenter__(self):
+        return self.generator
+
+    async def __aexit__(self, *args):
+        await self.generator.aclose()
+
+
+def free_udp_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class TestAsyncSources(IsolatedAsyncioTestCase):
+    async def serve(self, handler):
+        server = await asyncio.start_server(handler, '127.0.0.1', 0)
+        self.addAsyncCleanup(self.close_server, server)
+        return server.sockets[0].getsockname()[1]
+
+    @staticmethod
+    async def close_server(server):
+        server.close()
+        await server.wait_closed()
+
+    async def test_tcp(self):
+        async def handler(reader, writer):
+            writer.write(("\n".join(fragmented_message_type_8 + [message_type_1]) + "\n").encode('ascii'))
+            await writer.drain()
+            writer.close()
+
+        port = await self.serve(handler)
+        sentences = await asyncio.wait_for(take(2, ['tcp://127.0.0.1:{}'.format(port)]), 5)
+        self.assertEqual([8, 1], [s.type_id() for s in sentences])
+
+    async def test_sources_are_read_concurrently(self):
+        async def stalled(reader, writer):
+            await asyncio.sleep(60)
+
+        async def working(reader, writer):
+            writer.write((message_type_1 + "\n").encode('ascii'))
+            await writer.drain()
+            writer.close()
+
+        stalled_port = await self.serve(stalled)
+        working_port = await self.serve(working)
+        sentences = await asyncio.wait_for(take(1, ['tcp://127.0.0.1:{}'.format(stalled_port),
+                                                    'tcp://127.0.0.1:{}'.format(working_port)]), 5)
+        self.assertEqual(1, sentences[0].type_id())
+
+    async def test_reconnects(self):
+        connections = []
+
+        async def handler(reader, writer):
+            connections.append(writer)
+            writer.write((message_type_1 + "\n").encode('ascii'))
+            await writer.drain()
+            writer.close()
+
+        port = await self.serve(handler)
+        with mock.patch.object(aio, 'INITIAL_BACKOFF', 0.01):
+            sentences = await asyncio.wait_for(take(3, ['tcp://127.0.0.1:{}'.format(port)]), 5)
+        self.assertEqual(3, len(sentences))
+        self.assertGreaterEqual(len(connections), 3)
+
+    async def test_bad_line_keeps_connection(self):
+        connections = []
+
+        async def handler(reader, writer):
+            connections.append(writer)
+            writer.write(("\n".join(['bad', message_type_1, 'bad', message_type_1]) + "\n").encode('ascii'))
+            await writer.drain()
+            writer.close()
+
+        add = aio.StreamParser.add
+
+        def failing_add(parser, line, *args, **kwargs):
+            if line.strip() == 'bad':
+                raise RuntimeError("unparseable")
+            return add(parser, line, *args, **kwargs)
+
+        port = await self.serve(handler)
+        with mock.patch.object(aio.StreamParser, 'add', failing_add):
+            sentences = await asyncio.wait_for(take(2, ['tcp://127.0.0.1:{}'.format(port)]), 5)
+        self.assertEqual([1, 1], [s.type_id() for s in sentences])
+        self.assertEqual(1, len(connections))
+
+    async def test_udp(self):
+        port = free_udp_port()
+        receiver = asyncio.ensure_future(take(1, ['udp://127.0.0.1:{}'.format(port)]))
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            for _ in range(100):
+                s.sendto((message_type_1 + "\r\n").encode('ascii'), ('127.0.0.1', port))
+                done, _ = await asyncio.wait([receiver], timeout=0.05)
+                if done:
+                    break
+        self.assertEqual(1, (await receiver)[0].type_id())
+
+    async def test_chunked_http(self):
+        async def handler(reader, writer):
+            while (await reader.readline()) not in (b'\r\n', b''):
+                pass
+            body = ("\n".join(fragmented_message_type_8) + "\n").encode('ascii')
+            writer.write(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n')
+            for start in range(0, len(body), 50):
+                chunk = body[start:start + 50]
+                writer.write('{:x}\r\n'.format(len(chunk)).encode('ascii') + chunk + b'\r\n')
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+            writer.close()
+
+        port = await self.serve(handler)
+        sentences = await asyncio.wait_for(take(1, ['http://127.0.0.1:{}/feed'.format(port)]), 5)
+        self.assertEqual(fragmented_message_type_8, sentences[0].text)
+
+    async def test_bad_source(self):
+        with self.assertRaises(ValueError):
+            await take(1, ['ftp://example.com/feed'])
+        with self.assertRaises(ValueError):
+            await take(1, ['tcp://example.com'])
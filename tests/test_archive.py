@@ -0,0 +1,182 @@
+import functools
+import gzip
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+from unittest import TestCase
+
+from click.testing import CliRunner
+
+from simpleais import parse, sentences_from_source, sentences_from_shard, source_shards, _is_continuation
+from simpleais.archive import *
+from simpleais.tools import Taster, burst, cat, count_values, merge_counts, print_sentence_source, summarize_sources, \
+    tasty_sentences_from_sources
+
+sample = os.path.join(os.path.dirname(__file__), 'sample.ais')
+
+
+class TestArchiveIndex(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.plain = os.path.join(self.directory.name, 'sample.ais')
+        shutil.copy(sample, self.plain)
+        self.compressed = os.path.join(self.directory.name, 'sample.ais.gz')
+        with open(sample, 'rb') as f, gzip.open(self.compressed, 'wb') as out:
+            out.write(f.read())
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_blocks_cover_file(self):
+        blocks = index_source(self.plain, block_size=20000)
+        self.assertGreater(len(blocks), 5)
+        self.assertEqual(os.path.getsize(self.plain), sum(b.length for b in blocks))
+        with open(self.plain, 'rb') as f:
+            for block in blocks:
+                self.assertFalse(_is_continuation(block_lines(f, block).readline()))
+
+    def test_round_trip(self):
+        blocks = index_source(self.plain, block_size=20000)
+        loaded = read_index(self.plain)
+        self.assertEqual([(b.offset, b.length, b.start_time, b.end_time, b.mmsis) for b in blocks],
+                         [(b.offset, b.length, b.start_time, b.end_time, b.mmsis) for b in loaded])
+        self.assertIn(367678850, set().union(*[b.mmsis for b in loaded]))
+
+    def test_all_sentences(self):
+        index_source(self.plain, block_size=20000)
+        expected = [s.text for s in sentences_from_source(sample)]
+        actual = [s.text for s in sentences_from_indexed_source(self.plain, read_index(self.plain))]
+        self.assertEqual(expected, actual)
+
+    def test_recompression(self):
+        blocks = index_source(self.compressed, block_size=20000)
+        self.assertGreater(len(blocks), 5)
+        self.assertEqual([b.offset for b in blocks], block_offsets(self.compressed)[:-1])
+        with open(sample, 'rb') as f, gzip.open(self.compressed, 'rb') as g:
+            self.assertEqual(f.read(), g.read())
+        expected = [s.text for s in sentences_from_source(sample)]
+        actual = [s.text for s in sentences_from_indexed_source(self.compressed, read_index(self.compressed))]
+        self.assertEqual(expected, actual)
+
+    def test_grep(self):
+        index_source(self.compressed, block_size=20000)
+        for taster in [Taster(mmsi=['366982270']), Taster(after=1452468600, before=1452468700),
+                       Taster(mmsi=['367678850'], after=1452468600)]:
+            expected = [s.text for s in tasty_sentences_from_sources(taster, [sample])]
+            actual = [s.text for s in tasty_sentences_from_sources(taster, [self.compressed])]
+            self.assertTrue(expected)
+            self.assertEqual(expected, actual)
+
+    def test_skips_blocks(self):
+        blocks = index_source(self.plain, block_size=20000)
+        self.assertLess(len([b for b in blocks if b.might_match(mmsis={366982270})]), len(blocks))
+        self.assertLess(len([b for b in blocks if b.might_match(before=1452468600)]), len(blocks))
+
+    def test_corrupt_lines(self):
+        with open(sample) as f:
+            lines = f.readlines()
+        lines[100] = lines[100].replace(',A,', ',A,1~~~', 1)
+        lines[5000] = 'garbage data\n'
+        unindexed = os.path.join(self.directory.name, 'unindexed.ais')
+        for path in [self.plain, unindexed]:
+            with open(path, 'w') as f:
+                f.writelines(lines)
+        blocks = index_source(self.plain, block_size=20000)
+        self.assertEqual(os.path.getsize(self.plain), sum(b.length for b in blocks))
+        for taster in [Taster(mmsi=['366982270']), Taster(mmsi=['367678850'])]:
+            expected = [s.text for s in tasty_sentences_from_sources(taster, [unindexed])]
+            actual = [s.text for s in tasty_sentences_from_sources(taster, [self.plain])]
+            self.assertTrue(expected)
+            self.assertEqual(expected, actual)
+
+    def test_stale_index(self):
+        index_source(self.plain)
+        with open(self.plain, 'a') as f:
+            f.write('!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F\n')
+        self.assertIsNone(read_index(self.plain))
+
+    def test_no_index(self):
+        self.assertIsNone(read_index(self.plain))
+
+
+class TestBlockGzip(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'out.ais.gz')
+        self.sentences = list(sentences_from_source(sample))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, sentences, block_size=20000):
+        with BlockGzipWriter.open(self.path, block_size) as writer:
+            for sentence in sentences:
+                print_sentence_source(sentence, writer)
+
+    def test_gunzip_compatible(self):
+        self.write(self.sentences)
+        with gzip.open(self.path, 'rt') as f:
+            self.assertEqual([s.text for s in self.sentences], [s.text for s in parse(f.readlines())])
+
+    def test_block_table(self):
+        self.write(self.sentences)
+        offsets = block_offsets(self.path)
+        self.assertGreater(len(offsets), 10)
+        for start, end in zip(offsets, offsets[1:]):
+            first_line = next(lines_from_block_range(self.path, start, end))
+            self.assertFalse(_is_continuation(first_line))
+
+    def test_not_block_gzip(self):
+        with gzip.open(self.path, 'wt') as f:
+            f.write('!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F\n')
+        self.assertIsNone(block_offsets(self.path))
+
+    def test_append(self):
+        self.write(self.sentences[:1000])
+        first_offsets = block_offsets(self.path)
+        self.write(self.sentences[1000:])
+        self.assertEqual(first_offsets, block_offsets(self.path)[:len(first_offsets)])
+        actual = [s.text for s in sentences_from_shard((self.path, first_offsets[-1], block_offsets(self.path)[-1]))]
+        self.assertEqual([s.text for s in self.sentences[1000:]], actual)
+
+    def test_append_twice(self):
+        self.write(self.sentences[:1000])
+        self.write(self.sentences[1000:2000])
+        self.write(self.sentences[2000:])
+        offsets = block_offsets(self.path)
+        for start, end in zip(offsets, offsets[1:]):
+            self.assertTrue(list(lines_from_block_range(self.path, start, end)))
+        with gzip.open(self.path, 'rt') as f:
+            self.assertEqual([s.text for s in self.sentences], [s.text for s in parse(f.readlines())])
+
+    def test_shards(self):
+        self.write(self.sentences)
+        shards = source_shards([self.path], shard_size=100000)
+        self.assertGreater(len(shards), 2)
+        actual = [s.text for shard in shards for s in sentences_from_shard(shard)]
+        self.assertEqual([s.text for s in self.sentences], actual)
+
+    def test_parallel_summary(self):
+        self.write(self.sentences)
+        count_types = functools.partial(count_values, ['type'])
+        expected = summarize_sources(count_types, merge_counts, defaultdict(int), [sample])
+        actual = summarize_sources(count_types, merge_counts, defaultdict(int), [self.path], jobs=2,
+                                   shard_size=100000)
+        self.assertEqual(dict(expected), dict(actual))
+
+    def test_burst(self):
+        result = CliRunner().invoke(burst, [sample, os.path.join(self.directory.name, 'sender.ais.gz')])
+        self.assertEqual(0, result.exit_code)
+        path = os.path.join(self.directory.name, 'sender.ais-366982270.gz')
+        self.assertIsNotNone(block_offsets(path))
+        self.assertEqual([s.text for s in self.sentences if s.mmsi_int == 366982270],
+                         [s.text for s in sentences_from_source(path)])
+
+    def test_cat(self):
+        result = CliRunner().invoke(cat, ['--gzip', sample])
+        self.assertEqual(0, result.exit_code)
+        with open(self.path, 'wb') as f:
+            f.write(result.stdout_bytes)
+        self.assertIsNotNone(block_offsets(self.path))
+        self.assertEqual([s.text for s in self.sentences], [s.text for s in sentences_from_source(self.path)])
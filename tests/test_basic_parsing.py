@@ -74,11 +74,68 @@ class TestBasicParsing(TestCase):
         good_and_bad = Sentence.from_fragments([good_and_bad_1, good_and_bad_2])
         self.assertFalse(good_and_bad.check())
 
+    def test_checksum_validity_is_stored(self):
+        good = parse("!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F")
+        bad = parse("!AIVDM,1,1,,A,ENkb9I99S@:9h4W17bW2@I7@@@;V4=v:nv;h00003vP000,2*15")
+        self.assertEqual((True, False), (good.valid, bad.valid))
+        self.assertEqual([False], bad.fragment_checksum_validity())
+        fragments = [parse("!AIVDM,2,1,6,B,55NEA8T00001L@GC7WT4h<5A85b0<hU10E:2000t1@`56t0Ht04hC`1TPCPj,0*10"),
+                     parse("!AIVDM,2,2,6,B,Dhkh0000000,2*0F")]
+        self.assertEqual([True, False], [f.valid for f in fragments])
+        self.assertEqual([True, False], Sentence.from_fragments(fragments).fragment_checksum_validity())
+        for text in ["!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F", "!AIVDM,2,2,6,B,Dhkh0000000,2*0F"]:
+            self.assertEqual(int(text[-2:], 16) == nmea_checksum(text), simpleais._checksum_valid(text, text[-2:]))
+
+    def test_corrupt_trailing_character(self):
+        good = parse('!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F')
+        bad = parse('!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1~,0*1F')
+        for field in ['mmsi', 'speed', 'lon', 'lat', 'second']:
+            self.assertEqual(good[field], bad[field])
+        self.assertIsNone(bad['radio'])
+        self.assertEqual(367678850, bad.mmsi_int)
+        values = bad.field_values()
+        self.assertIsNone(values['radio'])
+        self.assertEqual(good['lon'], values['lon'])
+
+        fragments = [simpleais.parse_one(line) for line in fragmented_message_type_8]
+        fragments[1] = simpleais.parse_one(fragmented_message_type_8[1].replace('ApU6', 'Ap~6'))
+        sentence = Sentence.from_fragments(fragments)
+        self.assertEqual('367909000', sentence['mmsi'])
+        self.assertEqual(56, sentence.payload.int_for_bit_range(264, 270))
+        with self.assertRaises(ValueError):
+            sentence.payload.int_for_bit_range(268, 274)
+
+    def test_pickling(self):
+        import pickle
+        sentence = pickle.loads(pickle.dumps(simpleais.parse(fragmented_message_type_8)[0]))
+        self.assertEqual(fragmented_message_type_8, sentence.text)
+        self.assertEqual('367909000', sentence['mmsi'])
+
     def test_missing_channel(self):
         # seen in the wild via AISHub
         f = parse('!ABVDM,1,1,,,13a57D0P@005CH@MinkdJ0q:0>`<,0*31')
         self.assertEqual(1, f.type_id())
 
+    def test_compact_single_fragment(self):
+        text = '!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F'
+        sentence = parse(text)
+        self.assertFalse(hasattr(sentence, '__dict__'))
+        self.assertFalse(hasattr(sentence.payload, '__dict__'))
+        self.assertEqual([text], sentence.text)
+        self.assertEqual(['1F'], sentence.checksums)
+        self.assertEqual("[NmeaLump('15NaEPPP01oR`R6CC?<j@gvr0<1C', 0)]", repr(sentence.payload.data))
+        self.assertTrue(sentence.check())
+
+    def test_mmsi(self):
+        first = parse('!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F')
+        second = parse('!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F')
+        self.assertEqual(int(first['mmsi']), first.mmsi_int)
+        self.assertIs(first['mmsi'], second['mmsi'])
+
+    def test_stray_asterisk(self):
+        self.assertIsNone(parse('!AIVDM,1,1,,B,15Mqd*0Rk,0*06'))
+        self.assertIsNone(parse('!AIVDM,1,1,*,B,15MqdBP00a1GRT=rCCUubJhNN0,0*06'))
+
     def test_freakish_sentences(self):
         # not sensible, but seen in the wild, might as well roll with it
         f = parse('!AIVDM,1,1,,B,SA8L00@00:;0k@4LO7Q3owuL00008:0005f000000000000004@P,0*1F')
@@ -181,6 +238,27 @@ class TestStreamParser(TestCase):
         self.assertIsNotNone(sentence_time)
         self.assertAlmostEqual(sentence_time, sentence_time, places=3)
 
+    def test_payload_filter(self):
+        type_1 = '!ABVDM,1,1,,A,15MqdBP001GRT>>CCUu360Lr041d,0*69'
+        p = StreamParser(payload_filter=lambda payload: type_and_mmsi(payload)[0] == 8)
+        for line in [type_1] + fragmented_message_type_8 + [type_1]:
+            p.add(line)
+        self.assertEqual(8, p.next_sentence().type_id())
+        self.assertFalse(p.has_sentence())
+        self.assertEqual(2, p.filtered_count)
+
+        p = StreamParser(payload_filter=lambda payload: type_and_mmsi(payload)[0] == 1)
+        for line in fragmented_message_type_8 + [type_1]:
+            p.add(line)
+        self.assertEqual(1, p.next_sentence().type_id())
+        self.assertFalse(p.has_partial_sentence())
+
+    def test_type_and_mmsi(self):
+        self.assertEqual((1, 367678850), type_and_mmsi('15NaEPPP01oR`R6CC?<j@gvr0<1C'))
+        self.assertIsNone(type_and_mmsi('15NaEP'))
+        self.assertIsNone(type_and_mmsi('15Na~PPP01oR`R6CC?<j@gvr0<1C'))
+        self.assertEqual((1, 367678850), type_and_mmsi('15NaEPP~01oR`R6CC?<j@gvr0<1C'))
+
     def test_missing_channel(self):
         # seen in the wild via AISHub
         p = StreamParser()
@@ -189,6 +267,99 @@ class TestStreamParser(TestCase):
         p.add('!AIVDM,2,2,2,,CH88888888880,2*6C in source aishub.ais')
         self.assertEqual(5, p.next_sentence().type_id())
 
+    interleaved_type_5 = ['!AIVDM,2,1,0,B,55QEQ`42Cktc<IL?J20@tpNl61A8U@tr2222221@BhQ,0*45',
+                          '!AIVDM,2,1,7,B,54`Ut;l2CO<P?H53<010DL5=E>1HuT4LE800001@LHi,0*12',
+                          '!AIVDM,2,2,0,B,H86tl0PDSlhDRE3p3F8888888880,2*57',
+                          '!AIVDM,2,2,7,B,JF6uF0G1H40C0000000000000000,2*50']
+
+    def test_interleaved_fragments(self):
+        p = StreamParser()
+        for line in self.interleaved_type_5:
+            p.add(line)
+        self.assertEqual('DONG-A TRITON', p.next_sentence()['shipname'])
+        self.assertEqual('PEGASUS VOYAGER', p.next_sentence()['shipname'])
+        self.assertFalse(p.has_partial_sentence())
+        self.assertEqual(0, p.dropped_fragment_count)
+
+    def test_fragment_group_limit(self):
+        p = StreamParser(max_fragment_groups=1)
+        for line in self.interleaved_type_5:
+            p.add(line)
+        self.assertFalse(p.has_sentence())
+        self.assertEqual(3, p.dropped_fragment_count)
+
+    def test_fragment_expiry(self):
+        first, second, rest_of_first, _ = self.interleaved_type_5
+        p = StreamParser(fragment_timeout=60)
+        p.add('1500000000.000 ' + first)
+        p.add('1500000100.000 ' + second)
+        p.add('1500000101.000 ' + rest_of_first)
+        self.assertFalse(p.has_sentence())
+        self.assertEqual(1, p.expired_fragment_count)
+        self.assertTrue(p.has_partial_sentence())
+
+    def test_raw_sentences(self):
+        lines = ['1500000000.000 !ABVDM,1,1,,A,15MqdBP001GRT>>CCUu360Lr041d,0*69'] + fragmented_message_type_8 + \
+                ['!AIVDM,1,1,,B,15Mqd*0Rk,0*06', '!AIVDM,1,1,,A,1,0*57']
+        decoded = parse_many(lines)
+        p = StreamParser(raw=True)
+        raw = []
+        for line in lines:
+            p.add(line)
+            while p.has_sentence():
+                raw.append(p.next_sentence())
+        self.assertTrue(all(isinstance(s, RawSentence) for s in raw))
+        self.assertEqual([(s.text, s.time) for s in decoded], [(s.text, s.time) for s in raw])
+        self.assertEqual([s.mmsi_int for s in decoded[:2]], [s.mmsi_int for s in raw[:2]])
+        self.assertIsNone(raw[2].mmsi_int)
+
+        p = StreamParser(raw=True)
+        p.add('!ABVDM,1,1,,A,~5NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F')
+        self.assertFalse(p.has_sentence())
+        p.add('!ABVDM,1,1,,A,15Na~PPP01oR`R6CC?<j@gvr0<1C,0*1F')
+        self.assertIsNone(p.next_sentence().mmsi_int)
+
+    def test_drop_invalid(self):
+        bad_single = '!AIVDM,1,1,,A,ENkb9I99S@:9h4W17bW2@I7@@@;V4=v:nv;h00003vP000,2*15'
+        bad_fragments = ['!AIVDM,2,1,6,B,55NEA8T00001L@GC7WT4h<5A85b0<hU10E:2000t1@`56t0Ht04hC`1TPCPj,0*10',
+                         '!AIVDM,2,2,6,B,Dhkh0000000,2*0F']
+        lines = [bad_single] + bad_fragments + fragmented_message_type_8
+        p = StreamParser()
+        for line in lines:
+            p.add(line)
+        self.assertEqual([False, False, True], [p.next_sentence().valid for _ in range(3)])
+
+        p = StreamParser(drop_invalid=True)
+        for line in lines:
+            p.add(line)
+        self.assertEqual(fragmented_message_type_8, p.next_sentence().text)
+        self.assertFalse(p.has_sentence())
+        self.assertEqual(2, p.invalid_count)
+
+    def test_duplicate_filter(self):
+        type_1 = '!ABVDM,1,1,,A,15MqdBP001GRT>>CCUu360Lr041d,0*69'
+        repeated = ['1500000000.000 ' + type_1, '1500000001.000 ' + type_1]
+        repeated += ['1500000002.000 ' + line for line in fragmented_message_type_8] * 2
+        repeated += ['1500000100.000 ' + type_1]
+        duplicate_filter = DuplicateFilter(window=10)
+        p = StreamParser(duplicate_filter=duplicate_filter)
+        for line in repeated:
+            p.add(line)
+        self.assertEqual([1, 8, 1], [p.next_sentence().type_id() for _ in range(3)])
+        self.assertFalse(p.has_sentence())
+        self.assertEqual(2, duplicate_filter.duplicate_count)
+
+        other_receiver = StreamParser(duplicate_filter=duplicate_filter)
+        other_receiver.add('1500000101.000 ' + type_1)
+        self.assertFalse(other_receiver.has_sentence())
+
+    def test_duplicate_history_is_bounded(self):
+        duplicate_filter = DuplicateFilter(window=10, size=2)
+        for payload in ['a', 'b', 'c', 'a']:
+            self.assertFalse(duplicate_filter.is_duplicate(payload, 0))
+        self.assertTrue(duplicate_filter.is_duplicate('c', 0))
+        self.assertEqual(2, len(duplicate_filter._history))
+
 
 class TestFragmentPool(TestCase):
     def __init__(self, method_name='runTest'):
@@ -249,6 +420,19 @@ class TestFragmentPool(TestCase):
         f.add(parse('!AIVDM,2,2,6,A,00000000000,2*22'))
         self.assertFalse(f.has_full_sentence())
 
+    def test_discard_count(self):
+        f = FragmentPool()
+        self.assertEqual(0, f.add(self.cooked_fragments[0]))
+        self.assertEqual(0, f.add(self.cooked_fragments[1]))
+        self.assertEqual(2, f.add(self.cooked_fragments[0]))
+
+    def test_repeated_fragment(self):
+        f = FragmentPool()
+        for fragment in self.cooked_fragments:
+            f.add(fragment)
+            f.add(fragment)
+        self.assertTrue(f.has_full_sentence())
+
 
 
 
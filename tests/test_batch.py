@@ -0,0 +1,70 @@
+import os
+from unittest import TestCase
+
+import numpy
+
+from simpleais import parse, sentences_from_source
+from simpleais.batch import decode_batch
+
+sample_file = os.path.join(os.path.dirname(__file__), 'sample.ais')
+
+
+class TestDecodeBatch(TestCase):
+    def test_position_report(self):
+        result = decode_batch(['1454124838.633 !ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F'])
+        self.assertEqual([1], list(result['type']))
+        self.assertEqual([367678850], list(result['mmsi']))
+        self.assertAlmostEqual(-118.2634, result['lon'][0])
+        self.assertAlmostEqual(33.7302, result['lat'][0])
+        self.assertAlmostEqual(0.1, result['speed'][0])
+        self.assertAlmostEqual(57.8, result['course'][0])
+
+    def test_skips_other_types_and_fragments(self):
+        result = decode_batch(['!AIVDM,1,1,,B,402M45iv0c?NN0dST0TPK@7008Aq,0*7F',
+                               '!AIVDM,2,1,8,A,55Mw0BP00001L=WKC?98uT4j1=@580000000000t1@D5540Ht6?UDp4iSp=<,0*74',
+                               '!AIVDM,2,2,8,A,@0000000000,2*5C',
+                               'garbage',
+                               '!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F'])
+        self.assertEqual([1], list(result['type']))
+
+    def test_invalid_and_short_positions_are_masked(self):
+        result = decode_batch(['!AIVDM,1,1,,A,2C2ILGC4oRgoT?r1fdC3wcvi26;8,0*33',  # longitude of 221.8539
+                               '!ABVDM,1,1,,A,152MQ1qP?w<tSF0l4Q@>4?wp1p7G,0*78',  # no position available
+                               '!AIVDM,1,1,,A,15Mw0G,0*67'],  # far too short
+                              fields=('mmsi', 'lon', 'lat'))
+        self.assertEqual([True, True, True], list(numpy.ma.getmaskarray(result['lon'])))
+        self.assertEqual([False, True, True], list(numpy.ma.getmaskarray(result['lat'])))
+        self.assertAlmostEqual(3.0226, result['lat'][0])
+        self.assertTrue(numpy.ma.is_masked(result['mmsi'][2]))
+
+    def test_characters_that_arent_armor(self):
+        lines = ['!ABVDM,1,1,,A,15Na\ufffdPPP01oR`R6CC?<j@gvr0<1C,0*1F',  # as decoded with errors='replace'
+                 '!ABVDM,1,1,,A,15Na!PPP01oR`R6CC?<j@gvr0<1C,0*1F',
+                 '!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1\xe9,0*1F',
+                 '!ABVDM,1,1,,A,!5NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F',  # no message type, so skipped
+                 '!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F']
+        result = decode_batch(lines, message_types=())
+        self.assertEqual([True, True, False, False], list(numpy.ma.getmaskarray(result['mmsi'])))
+        self.assertEqual([367678850, 367678850], list(result['mmsi'][2:]))
+        self.assertEqual([-118.2634] * 4, list(result['lon']))
+        self.assertEqual([None, None, 367678850], [parse(line).mmsi_int for line in lines[:3]])
+
+    def test_empty(self):
+        result = decode_batch([])
+        self.assertEqual(0, len(result['mmsi']))
+
+    def test_matches_sentence_decoding(self):
+        fields = ('received_at', 'mmsi', 'lon', 'lat', 'speed', 'course', 'heading', 'status', 'accuracy')
+        with open(sample_file) as f:
+            result = decode_batch(f, fields=fields, block_size=1000)
+        sentences = [s for s in sentences_from_source(sample_file) if s.type_id() in (1, 2, 3, 18)]
+        self.assertEqual(len(sentences), len(result['mmsi']))
+        for i, sentence in enumerate(sentences):
+            self.assertEqual(sentence.time, result['received_at'][i])
+            self.assertEqual(int(sentence['mmsi']), result['mmsi'][i])
+            for field in ('lon', 'lat', 'speed', 'course', 'heading', 'accuracy'):
+                expected = sentence[field]
+                actual = None if numpy.ma.is_masked(result[field][i]) else result[field][i]
+                self.assertEqual(expected, actual, "{} for {}".format(field, sentence.text))
+            if sentence['status'] is not None:
+                self.assertEqual(int(sentence['status']), result['status'][i])
@@ -192,6 +192,38 @@ class TestNettlesomePackets(TestCase):
         self.assertFalse(m.field('mmsiseq4').valid())
 
 
+class TestCompiledDecoding(TestCase):
+    def assert_matches_field_by_field(self, sentence):
+        values = sentence.field_values()
+        self.assertEqual([f.name() for f in sentence.fields()], list(values.keys()))
+        for field in sentence.fields():
+            self.assertEqual(field.value(), values[field.name()], "for {}".format(field.name()))
+
+    def test_position_report(self):
+        self.assert_matches_field_by_field(parse('!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F'))
+
+    def test_multiple_fragments(self):
+        self.assert_matches_field_by_field(
+            parse(['!AIVDM,2,1,8,A,55Mw0BP00001L=WKC?98uT4j1=@580000000000t1@D5540Ht6?UDp4iSp=<,0*74',
+                   '!AIVDM,2,2,8,A,@0000000000,2*5C'])[0])
+
+    def test_derived_time(self):
+        sentence = parse('!AIVDM,1,1,,B,402M45iv0c?NN0dST0TPK@7008Aq,0*7F')
+        self.assert_matches_field_by_field(sentence)
+        self.assertEqual(calendar.timegm((2016, 2, 22, 15, 30, 30, 0)), sentence.field_values()['time'])
+
+    def test_short_packet(self):
+        sentence = parse("1452468619.999 !AIVDM,1,1,,A,75gR`rBPLlNtuiugkkAiQ<3bw0,4*52")
+        self.assert_matches_field_by_field(sentence)
+        self.assertEqual(sentence['mmsiseq3'], sentence.field_values()['mmsiseq3'])
+
+    def test_variable_length_data(self):
+        sentence = parse(["!AIVDM,2,1,3,A,A@2bBWjeoU`uP0@0eL9@DOpl061C00l025wwT@1@:Orl07i1vQL03ngn801d,0*09",
+                          "!AIVDM,2,2,3,A,=h0505`SwpH0FTH21h0u=gl702h0,0*23"])[0]
+        self.assert_matches_field_by_field(sentence)
+        self.assertEqual(sentence['data'], sentence.field_values()['data'])
+
+
 class TestRenderAsDict(TestCase):
     def setUp(self):
         super().setUp()
@@ -261,3 +293,61 @@ class TestRenderAsDict(TestCase):
             'dte': False}
 
         self.assertDictEqual(expected, sentence.as_dict())
+
+
+class TestValueCache(TestCase):
+    class CountingDecoder:
+        def __init__(self, decoder):
+            self.decoder = decoder
+            self.decoded = []
+
+        def __getattr__(self, name):
+            return getattr(self.decoder, name)
+
+        def __contains__(self, name):
+            return name in self.decoder
+
+        def decode(self, name, sentence):
+            self.decoded.append(name)
+            return self.decoder.decode(name, sentence)
+
+    def test_repeated_lookups_decode_once(self):
+        sentence = parse('!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F')
+        sentence._decoder = decoder = self.CountingDecoder(sentence._decoder)
+        self.assertEqual(sentence['speed'], sentence['speed'])
+        self.assertTrue('speed' in sentence)
+        self.assertIsNone(sentence['shipname'])
+        self.assertIsNone(sentence['shipname'])
+        self.assertEqual(['speed', 'shipname'], decoder.decoded)
+
+    def test_field_values_fill_the_cache(self):
+        sentence = parse('!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F')
+        values = sentence.field_values()
+        sentence._decoder = decoder = self.CountingDecoder(sentence._decoder)
+        self.assertEqual(values['mmsi'], sentence['mmsi'])
+        self.assertEqual(values['lon'], sentence['lon'])
+        self.assertEqual([], decoder.decoded)
+
+
+class TestTextDecoding(TestCase):
+    type_5 = ['!AIVDM,2,1,0,B,55QEQ`42Cktc<IL?J20@tpNl61A8U@tr2222221@BhQ,0*45',
+              '!AIVDM,2,2,0,B,H86tl0PDSlhDRE3p3F8888888880,2*57']
+
+    def test_repeated_names_come_from_cache(self):
+        first, second = parse(self.type_5), parse(self.type_5)
+        self.assertEqual('DONG-A TRITON', first[0]['shipname'])
+        hits = simpleais._text_for_int.cache_info().hits
+        self.assertIs(first[0]['shipname'], second[0]['shipname'])
+        self.assertEqual(hits + 1, simpleais._text_for_int.cache_info().hits)
+
+    def test_aligned_text(self):
+        payload = NmeaPayload('0123:;<=>?@AHPW`hw', 4)
+        for start, stop in [(0, 60), (6, 108), (12, 24), (0, 0)]:
+            self.assertEqual(simpleais._text_for_ragged_int(*payload._int_and_length(start, stop)),
+                             payload.text_for_bit_range(start, stop))
+        self.assertEqual('ABC', payload.text_for_bit_range(6, 24))
+
+    def test_ragged_text(self):
+        self.assertEqual('A', simpleais._text_for_int(0b000001, 6))
+        self.assertEqual('AA', simpleais._text_for_int(0b00000101, 8))
+        self.assertEqual('', simpleais._text_for_int(0, 0))
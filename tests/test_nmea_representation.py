@@ -85,3 +85,21 @@ class TestNmeaPayload(TestCase):
         body = '15NaEPPP01oR`R6CC?<j@gvr0<1C'
         p = NmeaPayload('%s' % body, 0)
         self.assertEqual(6 * len(body), len(p))
+
+    def test_int_spanning_fragments(self):
+        # shipname runs from bit 112 to 232; the first fragment carries 360 bits
+        self.assertEqual(self.type_5.int_for_bit_range(350, 370), int(self.type_5.bits[350:370]))
+        self.assertEqual(2, len(self.type_5._bit_range(self.type_5.bit_length() - 2, 1000)))
+
+    def test_text_spanning_fragments(self):
+        p = NmeaPayload.join([
+            NmeaPayload('3'),
+            NmeaPayload('4')])
+        self.assertEqual('CD', p.text_for_bit_range(0, 12))
+
+    def test_as_int(self):
+        p = NmeaPayload.join([
+            NmeaPayload('3', 1),
+            NmeaPayload('3', 1)])
+        self.assertEqual(33, p.as_int())
+        self.assertEqual(Bits(33, 10), p.bits)
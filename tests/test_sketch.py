@@ -0,0 +1,111 @@
+import pickle
+import random
+from collections import Counter
+from unittest import TestCase
+
+from simpleais.sketch import *
+
+
+class TestHyperLogLog(TestCase):
+    def test_empty(self):
+        self.assertEqual(0, HyperLogLog().count())
+
+    def test_small_counts_are_close(self):
+        hll = HyperLogLog()
+        for i in range(100):
+            hll.add(366000000 + i)
+            hll.add(366000000 + i)
+        self.assertAlmostEqual(100, hll.count(), delta=2)
+
+    def test_large_counts_are_within_bounds(self):
+        hll = HyperLogLog()
+        for i in range(200000):
+            hll.add(('mmsi', i))
+        self.assertAlmostEqual(200000, hll.count(), delta=200000 * 0.03)
+
+    def test_merge(self):
+        both = HyperLogLog()
+        first = HyperLogLog()
+        second = HyperLogLog()
+        for i in range(50000):
+            both.add(i)
+            (first if i % 3 else second).add(i)
+        self.assertEqual(both.count(), first.merge(second).count())
+
+    def test_mismatched_merge(self):
+        with self.assertRaises(ValueError):
+            HyperLogLog(10).merge(HyperLogLog(12))
+
+    def test_pickling(self):
+        hll = HyperLogLog(8)
+        for i in range(1000):
+            hll.add(i)
+        self.assertEqual(hll.count(), pickle.loads(pickle.dumps(hll)).count())
+
+
+class TestCountMinSketch(TestCase):
+    def setUp(self):
+        generator = random.Random(0)
+        self.keys = [generator.randint(0, 5000) for _ in range(20000)]
+        self.counts = Counter(self.keys)
+
+    def test_never_low_and_within_bound(self):
+        sketch = CountMinSketch(width=2048, depth=4)
+        for key in self.keys:
+            sketch.add(key)
+        self.assertEqual(len(self.keys), sketch.total)
+        misses = [key for key, count in self.counts.items()
+                  if not count <= sketch[key] <= count + sketch.error_bound()]
+        self.assertEqual([], [key for key in misses if sketch[key] < self.counts[key]])
+        self.assertLess(len(misses), len(self.counts) * 0.02)
+
+    def test_merge(self):
+        whole = CountMinSketch(width=256)
+        halves = [CountMinSketch(width=256), CountMinSketch(width=256)]
+        for i, key in enumerate(self.keys):
+            whole.add(key)
+            halves[i % 2].add(key)
+        merged = halves[0].merge(halves[1])
+        self.assertTrue((whole.table == merged.table).all())
+        self.assertEqual(whole.total, merged.total)
+
+    def test_mismatched_merge(self):
+        with self.assertRaises(ValueError):
+            CountMinSketch(width=256).merge(CountMinSketch(width=512))
+
+
+class TestHeavyHitters(TestCase):
+    def setUp(self):
+        generator = random.Random(0)
+        self.keys = [('mmsi', int(generator.paretovariate(1.2))) for _ in range(20000)]
+        self.counts = Counter(self.keys)
+
+    def test_most_common(self):
+        hitters = HeavyHitters(size=20, width=4096)
+        for key in self.keys:
+            hitters.add(key)
+        self.assertEqual([key for key, _ in self.counts.most_common(5)], [key for key, _ in hitters.most_common(5)])
+        for key, count in hitters.most_common():
+            self.assertLessEqual(self.counts[key], count)
+        self.assertEqual(20, len(hitters.most_common()))
+        self.assertAlmostEqual(len(self.counts), len(hitters), delta=len(self.counts) * 0.03)
+
+    def test_merge(self):
+        whole = HeavyHitters(size=10)
+        parts = [HeavyHitters(size=10) for _ in range(3)]
+        for i, key in enumerate(self.keys):
+            whole.add(key)
+            parts[i % 3].add(key)
+        merged = parts[0].merge(parts[1]).merge(parts[2])
+        self.assertEqual(whole.most_common(5), merged.most_common(5))
+        self.assertEqual(len(whole), len(merged))
+
+    def test_size_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            HeavyHitters(size=0)
+
+    def test_pickling(self):
+        hitters = HeavyHitters(size=5)
+        for key in self.keys[:1000]:
+            hitters.add(key)
+        self.assertEqual(hitters.most_common(), pickle.loads(pickle.dumps(hitters)).most_common())
@@ -1,4 +1,6 @@
+import socket
 import tempfile
+import threading
 from gzip import GzipFile
 from unittest import TestCase
 
@@ -67,6 +69,163 @@ class TestSourceHandling(TestCase):
                     self.assertRaises(StopIteration, sentences.__next__)
             logs.check(('root', 'WARNING', 'skipped: "garbage data"'))
 
+    def test_shards(self):
+        with tempfile.NamedTemporaryFile() as file:
+            self.write_sample_data(file)
+            size = os.path.getsize(file.name)
+            self.assertEqual([(file.name, None, None)], source_shards([file.name]))
+            self.assertEqual([(file.name, 0, 100), (file.name, 100, 200), (file.name, 200, size)],
+                             source_shards([file.name], shard_size=100))
+            self.assertEqual([('foo.gz', None, None)], source_shards(['foo.gz'], shard_size=100))
+
+    def test_shards_split_between_fragments(self):
+        with tempfile.NamedTemporaryFile() as file:
+            self.write_sample_data(file)
+            for shard_size in range(1, 200, 7):
+                sentences = []
+                for shard in source_shards([file.name], shard_size):
+                    sentences.extend(sentences_from_shard(shard))
+                self.assertEqual([8, 1], [s.type_id() for s in sentences], "for shard size {}".format(shard_size))
+
+    def test_shards_split_between_interleaved_fragments(self):
+        lines = [message_type_1,
+                 '!ABVDM,2,1,3,A,55NELv3PCbCQL@GCC?4Dm0U8F1=@5@F22222220SBHT;E69D0DkchH888888,0*17',
+                 '!AIVDM,2,1,5,A,55N48>01i;QqL@?O;W@<It<4m08Dhj222222220O10H557>eN:30H<Me8888,0*14',
+                 '!ABVDM,2,2,3,A,88888888880,2*2C',
+                 '!AIVDM,2,2,5,A,820T`888880,2*17',
+                 message_type_1]
+        with tempfile.NamedTemporaryFile() as file:
+            file.write(("\n".join(lines) + "\n").encode('ascii'))
+            file.flush()
+            expected = [s.text for s in sentences_from_source(file.name)]
+            self.assertEqual(4, len(expected))
+            for shard_size in range(1, 300, 5):
+                actual = [s.text for shard in source_shards([file.name], shard_size)
+                          for s in sentences_from_shard(shard)]
+                self.assertEqual(expected, actual, "for shard size {}".format(shard_size))
+
+    def test_parallel_sentences(self):
+        sample = os.path.join(os.path.dirname(__file__), 'sample.ais')
+        expected = [s.text for s in sentences_from_source(sample)]
+        actual = [s.text for s in parallel_sentences_from_sources([sample], jobs=2, shard_size=50000)]
+        self.assertEqual(expected, actual)
+
+    def test_mmap_source_by_sentence(self):
+        with tempfile.NamedTemporaryFile() as file:
+            self.write_sample_data(file)
+            sentences = sentences_from_mmap(file.name)
+            self.assertEqual(8, sentences.__next__().type_id())
+            self.assertEqual(1, sentences.__next__().type_id())
+            self.assertRaises(StopIteration, sentences.__next__)
+
+    def test_mmap_source_matches_file_source(self):
+        with tempfile.NamedTemporaryFile() as file:
+            file.write(b"1454124838.633\t" + bytes(message_type_1, "ascii") + b"\r\n")
+            file.write(b"junk 12 " + bytes(message_type_1, "ascii") + b" " + bytes(message_type_1, "ascii") + b"\n")
+            file.write(b"123\n" + bytes(message_type_1, "ascii"))
+            file.flush()
+            expected = [(s.time, s.text) for s in sentences_from_source(file.name)]
+            actual = [(s.time, s.text) for s in sentences_from_mmap(file.name)]
+            self.assertEqual([1454124838.633, 12.0, None], [t for t, _ in expected])
+            self.assertEqual(expected, actual)
+
+    def test_mmap_empty_file(self):
+        with tempfile.NamedTemporaryFile() as file:
+            self.assertEqual([], list(sentences_from_mmap(file.name)))
+
+    def test_udp_source(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        datagrams = [bytes("\r\n".join(fragmented_message_type_8) + "\r\n", "ascii"),
+                     bytes(message_type_1, "ascii"),  # no line ending
+                     bytes(message_type_1 + "\n", "ascii")]
+        received = threading.Event()
+
+        def send():
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                for _ in range(500):  # the receiver may not be bound yet
+                    for datagram in datagrams:
+                        s.sendto(datagram, ('127.0.0.1', port))
+                    if received.wait(0.01):
+                        return
+
+        sender = threading.Thread(target=send)
+        sender.start()
+        try:
+            sentences = sentences_from_source('udp://127.0.0.1:{}'.format(port))
+            first = [sentences.__next__() for _ in range(3)]
+            sentences.close()
+        finally:
+            received.set()
+            sender.join()
+        self.assertEqual([1, 1, 8], sorted(s.type_id() for s in first))  # we may start listening mid-cycle
+
+    def test_udp_source_needs_port(self):
+        self.assertRaises(ValueError, lines_from_source('udp://127.0.0.1').__next__)
+
+    def test_tcp_client_source(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.listen()
+            port = server.getsockname()[1]
+
+            def serve():
+                connection = server.accept()[0]
+                with connection:
+                    data = bytes("\r\n".join(fragmented_message_type_8 + [message_type_1]) + "\r\n", "ascii")
+                    for start in range(0, len(data), 7):  # lines will span reads
+                        connection.sendall(data[start:start + 7])
+
+            thread = threading.Thread(target=serve)
+            thread.start()
+            sentences = sentences_from_source('tcp://127.0.0.1:{}'.format(port))
+            self.assertEqual([8, 1], [sentences.__next__().type_id() for _ in range(2)])
+            sentences.close()
+            thread.join()
+
+    def test_tcp_listen_source(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+
+        def send():
+            for _ in range(500):  # the listener may not be up yet
+                try:
+                    with socket.create_connection(('127.0.0.1', port)) as connection:
+                        connection.sendall(bytes(message_type_1 + "\n", "ascii"))
+                        return
+                except ConnectionRefusedError:
+                    threading.Event().wait(0.01)
+
+        thread = threading.Thread(target=send)
+        thread.start()
+        lines = lines_from_source('tcp-listen://127.0.0.1:{}'.format(port))
+        self.assertEqual(message_type_1 + "\n", lines.__next__())
+        lines.close()
+        thread.join()
+
+        # closing stops listening, so the port can be listened on again
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            s.bind(('127.0.0.1', port))
+            s.listen()
+
+    def test_tcp_sources_need_port(self):
+        self.assertRaises(ValueError, lines_from_source('tcp://127.0.0.1').__next__)
+        self.assertRaises(ValueError, lines_from_source('tcp-listen://').__next__)
+
+    def test_line_batches(self):
+        import simpleais
+        a, b = socket.socketpair()
+        with a, b:
+            a.sendall(b"one\ntw")
+            a.sendall(b"o\nthree is long\nfour")
+            a.shutdown(socket.SHUT_WR)
+            lines = [line for batch in simpleais._line_batches(b, bytearray(8)) for line in batch]
+        self.assertEqual("one\ntwo\nthree is long\nfour", "".join(lines))
+        self.assertIn("two\n", lines)
+
     # TODO: figure out how to test serial and url sources effectively
 
     def write_sample_data(self, file, compress=False):
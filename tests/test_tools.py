@@ -1,6 +1,10 @@
+import random
+import tempfile
 from unittest import TestCase
 
-from simpleais import parse
+import numpy
+
+from simpleais import parse, source_shards
 from simpleais.tools import *
 
 
@@ -217,6 +221,47 @@ class TestDensityMap(TestCase):
             '+----+',
         ], m.to_text())
 
+    def test_streaming_grid(self):
+        generator = random.Random(0)
+        points = [(generator.gauss(-122.4, 0.05), generator.gauss(37.8, 0.03)) for _ in range(5000)]
+        points += [(-120.0, 36.0), (-125.0, 39.0)]
+        exact = DensityMap(20, height_scale=1)
+        streamed = DensityMap(20, height_scale=1, chunk_size=100)
+        for point in points:
+            exact.add(point)
+            streamed.add(point)
+        self.assertTrue(streamed.grid.valid())
+        expected = numpy.array(exact.to_counts())
+        actual = numpy.array(streamed.to_counts())
+        self.assertEqual(len(points), actual.sum())
+        self.assertLess(numpy.abs(expected - actual).sum() / 2, len(points) * 0.05)
+
+    def test_streaming_merge(self):
+        parts = [DensityMap(20, height_scale=1, chunk_size=50) for _ in range(3)]
+        whole = DensityMap(20, height_scale=1, chunk_size=50)
+        for i in range(600):
+            point = (i % 37 - 18.0, i % 23 - 11.0)
+            parts[i % 3].add(point)
+            whole.add(point)
+        parts[0].merge(parts[1])
+        parts[0].merge(parts[2])
+        self.assertEqual(600, parts[0].point_count)
+        self.assertEqual(600, numpy.array(parts[0].to_counts()).sum())
+        self.assertEqual(len(whole.to_text()), len(parts[0].to_text()))
+
+
+class TestDensityGrid(TestCase):
+    def test_grows_to_fit(self):
+        grid = DensityGrid(cells=8)
+        grid.add(numpy.array([0.0, 1.0]), numpy.array([0.0, 1.0]))
+        grid.add(numpy.array([-10.0, 5.0]), numpy.array([20.0, 0.5]))
+        self.assertEqual(4, grid.counts.sum())
+        lons, lats, counts = grid.cell_centers()
+        self.assertLessEqual(grid.origin[0], -10.0)
+        self.assertGreater(grid.origin[1] + 8 * grid.size[1], 20.0)
+        self.assertEqual(4, counts.sum())
+        self.assertEqual((8, 8), grid.counts.shape)
+
 
 class TestBucketer(TestCase):
     def test_basics(self):
@@ -351,12 +396,146 @@ class TestTaster(TestCase):
         self.assertFalse(taster.likes(early))
         self.assertTrue(taster.likes(late))
 
+    def test_raw_filter(self):
+        type_1 = '14Wtnn002SGLde:BbrBmdTLF0Vql'  # 310327000
+        type_5 = '5=JklSl00003UHDs:20l4E9<f04i@4U:22222217'
+        self.assertIsNone(Taster().raw_filter())
+        self.assertIsNone(Taster(lat=(32, 35)).raw_filter())
+        self.assertIsNone(Taster(sentence_type=[1], lat=(32, 35), mode='or').raw_filter())
+
+        raw_filter = Taster(mmsi=frozenset(['310327000']), lat=(32, 35)).raw_filter()
+        self.assertTrue(raw_filter(type_1))
+        self.assertFalse(raw_filter(type_5))
+        self.assertTrue(raw_filter('1'))  # too short to say
+        self.assertTrue(raw_filter('14W~nn002SGLde:BbrBmdTLF0Vql'))  # unreadable, so let likes() decide
+
+        raw_filter = Taster(sentence_type=[5], vessel_class='b', mode='or').raw_filter()
+        self.assertFalse(raw_filter(type_1))
+        self.assertTrue(raw_filter(type_5))
+
+        raw_filter = Taster(sentence_type=[5], invert_match=True).raw_filter()
+        self.assertTrue(raw_filter(type_1))
+        self.assertFalse(raw_filter(type_5))
+
     def test_invert_match(self):
         taster = Taster(lat=(32, 35), invert_match=True)  # LA
         self.assertFalse(taster.likes(self.type_1_la))
         self.assertTrue(taster.likes(self.type_1_sf))
 
 
+class TestParallelSummaries(TestCase):
+    sample = os.path.join(os.path.dirname(__file__), 'sample.ais')
+
+    def test_stat_counts(self):
+        count_types = functools.partial(count_values, ['type'])
+        expected = summarize_sources(count_types, merge_counts, defaultdict(int), [self.sample])
+        actual = summarize_sources(count_types, merge_counts, defaultdict(int), [self.sample, self.sample],
+                                   jobs=2, shard_size=100000)
+        self.assertEqual({k: 2 * v for k, v in expected.items()}, dict(actual))
+
+    def test_many_small_shards(self):
+        count_types = functools.partial(count_values, ['type'])
+        expected = summarize_sources(count_types, merge_counts, defaultdict(int), [self.sample])
+        self.assertGreater(len(source_shards([self.sample], shard_size=2000)), 200)
+        actual = summarize_sources(count_types, merge_counts, defaultdict(int), [self.sample], jobs=4,
+                                   shard_size=2000)
+        self.assertEqual(dict(expected), dict(actual))
+
+        expected = summarize_sources(summarize_info, InfoSummary.merge, InfoSummary(), [self.sample])
+        actual = summarize_sources(summarize_info, InfoSummary.merge, InfoSummary(), [self.sample],
+                                   jobs=4, shard_size=2000)
+        self.assertEqual(expected.sentences_info.sentence_count, actual.sentences_info.sentence_count)
+
+    def test_info(self):
+        expected = summarize_sources(summarize_info, InfoSummary.merge, InfoSummary(True, True, True), [self.sample])
+        actual = summarize_sources(summarize_info, InfoSummary.merge, InfoSummary(True, True, True), [self.sample],
+                                   jobs=2, shard_size=100000)
+        self.assertEqual(expected.sentences_info.sentence_count, actual.sentences_info.sentence_count)
+        self.assertEqual(expected.sentences_info.sender_counts, actual.sentences_info.sender_counts)
+        self.assertEqual(expected.map_info.to_text(), actual.map_info.to_text())
+        self.assertEqual(sorted(expected.sender_info), sorted(actual.sender_info))
+
+    def test_approximate(self):
+        count_mmsis = functools.partial(count_values, ['mmsi'])
+        expected = summarize_sources(count_mmsis, merge_counts, defaultdict(int), [self.sample])
+        count_mmsis = functools.partial(count_values_approximately, ['mmsi'])
+        actual = summarize_sources(count_mmsis, merge_hitters, HeavyHitters(10), [self.sample],
+                                   jobs=2, shard_size=100000)
+        self.assertEqual(sorted(expected.items(), key=lambda item: item[1], reverse=True)[:5],
+                         actual.most_common(5))
+        self.assertAlmostEqual(len(expected), len(actual), delta=len(expected) * 0.03)
+
+        summary = summarize_sources(summarize_info, InfoSummary.merge, InfoSummary(approximate=True), [self.sample],
+                                    jobs=2, shard_size=100000)
+        self.assertAlmostEqual(len(expected), len(summary.sentences_info.sender_counts), delta=len(expected) * 0.03)
+
+    def test_duplicates(self):
+        count_types = functools.partial(count_values, ['type'])
+        expected = summarize_sources(count_types, merge_counts, defaultdict(int), [self.sample],
+                                     duplicate_filter=DuplicateFilter())
+        with open(self.sample) as f:
+            lines = f.readlines()
+        with tempfile.TemporaryDirectory() as d:
+            merged = os.path.join(d, 'merged.ais')
+            with open(merged, 'w') as f:
+                f.writelines(line for line in lines for _ in range(2))
+            duplicate_filter = DuplicateFilter()
+            actual = summarize_sources(count_types, merge_counts, defaultdict(int), [merged],
+                                       jobs=2, duplicate_filter=duplicate_filter)
+        self.assertEqual(dict(expected), dict(actual))
+        self.assertLess(sum(expected.values()), duplicate_filter.duplicate_count)
+
+
+class TestMergeByTime(TestCase):
+    lines = ["1452468552.938 !AIVDM,1,1,,B,14Wtnn002SGLde:BbrBmdTLF0Vql,0*6E",
+             "1452468552.981 !ABVDM,1,1,,B,15N2Wl?P02oRV=nCBrNn3gvJ2@7T,0*12",
+             "1452468553.100 !ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F",
+             "1452468554.000 !ABVDM,1,1,,A,152MQ1qP?w<tSF0l4Q@>4?wp1p7G,0*78"]
+
+    def test_merge(self):
+        with tempfile.TemporaryDirectory() as d:
+            sources = [os.path.join(d, 'even.ais'), os.path.join(d, 'odd.ais')]
+            for source, lines in zip(sources, [self.lines[0::2], self.lines[1::2]]):
+                with open(source, 'w') as f:
+                    f.write("\n".join(lines) + "\n")
+            merged = [s.time for s in sentences_from_sources(sources, merge=True)]
+            concatenated = [s.time for s in sentences_from_sources(sources)]
+        self.assertEqual(sorted(concatenated), merged)
+        self.assertNotEqual(merged, concatenated)
+
+    def test_holds_one_sentence_per_stream(self):
+        read = []
+
+        def stream(lines):
+            for sentence in parse(lines):
+                read.append(sentence)
+                yield sentence
+
+        merged = merge_by_time([stream(self.lines[0::2]), stream(self.lines[1::2])])
+        self.assertEqual(1452468552.938, next(merged).time)
+        self.assertEqual(2, len(read))
+
+
+class TestColumnExport(TestCase):
+    def test_npz_columns(self):
+        sentences = parse(["1452468552.938 !AIVDM,1,1,,B,14Wtnn002SGLde:BbrBmdTLF0Vql,0*6E",
+                           "!ABVDM,1,1,,A,152MQ1qP?w<tSF0l4Q@>4?wp1p7G,0*78",
+                           "!AIVDM,2,1,8,A,55Mw0BP00001L=WKC?98uT4j1=@580000000000t1@D5540Ht6?UDp4iSp=<,0*74",
+                           "!AIVDM,2,2,8,A,@0000000000,2*5C",
+                           "!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F"])
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'out.npz')
+            write_columns(sentences, column_writer_for(path), row_group_size=2)
+            columns = numpy.load(path)
+            self.assertEqual(['310327000', '338125063'], list(columns['type1.mmsi.0']))
+            self.assertEqual(['367678850'], list(columns['type1.mmsi.1']))
+            self.assertEqual([True, False], list(columns['type1.lon.0.valid']))
+            self.assertAlmostEqual(-118.2634, columns['type1.lon.1'][0])
+            self.assertEqual([1452468552.938], list(columns['type1.received_at.0'][:1]))
+            self.assertEqual(['ROYAL STAR'], list(columns['type5.shipname.0']))
+            self.assertEqual([60], list(columns['type5.shiptype.0']))
+
+
 from click.testing import CliRunner
 
 
@@ -380,6 +559,31 @@ class CommandLineSmokeTest(TestCase):
                 self.assertEqual(0, result.exit_code, "for {}".format(c.name))
                 self.assertTrue(len(result.output) > 0, "for {}".format(c.name))
 
+    def test_burst_garbled_header(self):
+        with tempfile.TemporaryDirectory() as d:
+            source = os.path.join(d, 'example.ais')
+            with open(source, 'w') as f:
+                f.write("!AIVDM,1,1,,B,14W~nn002SGLde:BbrBmdTLF0Vql,0*6E\n")
+                f.write("!AIVDM,1,1,,B,14Wtnn002SGLde:BbrBmdTLF0Vql,0*6E\n")
+            result = CliRunner().invoke(burst, [source])
+            self.assertEqual(0, result.exit_code)
+            self.assertEqual(['example-310327000.ais', 'example-other.ais', 'example.ais'], sorted(os.listdir(d)))
+
+    def test_info_garbled_mmsi(self):
+        with tempfile.TemporaryDirectory() as d:
+            source = os.path.join(d, 'example.ais')
+            with open(source, 'w') as f:
+                f.write("!ABVDM,1,1,,A,15NaEPPP01oR`R6CC?<j@gvr0<1C,0*1F\n")
+                f.write("!ABVDM,1,1,,A,15Na~PPP01oR`R6CC?<j@gvr0<1C,0*24\n")
+            result = CliRunner().invoke(info, ['-i', source])
+            self.assertEqual(0, result.exit_code, result.output)
+            self.assertIn('367678850', result.output)
+
+    def test_stat_rejects_empty_top(self):
+        result = CliRunner().invoke(stat, ['-a', '--top', '0', '-f', 'mmsi', '/dev/null'])
+        self.assertEqual(2, result.exit_code)
+        self.assertIn('--top', result.output)
+
     def args_for(self, c, file='/dev/null'):
         if c in self.required_args:
             return self.required_args[c] + [file]